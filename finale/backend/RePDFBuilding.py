@@ -2,108 +2,101 @@
 import fitz
 import os
 from collections import defaultdict
-from datetime import datetime
 
-def highlight_refined_texts(output):
-    """
-    Create annotated copies of PDFs with highlights for the selected sections.
-    - For each document in output['extracted_sections'], we create a copy of the original PDF
-      (uploads/annotated_<timestamp>_<origfile>) and add highlight annotations per rect.
-    - We DO NOT modify the original PDF.
-    - Returns a mapping: { "original_filename.pdf": "annotated_<ts>_original_filename.pdf", ... }
-    """
-    print("[RePDFBuilding] Starting highlight -> annotated-copy process")
-    files = defaultdict(list)
+DEFAULT_COLOR = (1, 1, 0)  # viewer yellow, as fitz highlight annots default to
+
 
+def _group_sections(output):
+    files = defaultdict(list)
     for sec in output.get("extracted_sections", []):
         fname = sec.get('document')
         if not fname:
             continue
         files[fname].append(sec)
+    return files
 
-    annotated_map = {}  # original_filename -> annotated_filename
 
-    for fname, sections in files.items():
-        src_path = os.path.join("uploads", fname)
-        if not os.path.exists(src_path):
-            print(f"[RePDFBuilding] Skipping missing file: {src_path}")
-            continue
+def _section_boxes(sections, fname):
+    """
+    Yield (page_number, [x0, y0, x1, y1]) for every usable rect of the given sections.
+    - dict rects {page, bbox} are used as-is
+    - legacy list rects fall back to the section's page_number
+    """
+    for sec in sections:
+        rects = sec.get('rects', []) or []
+        page_hint = sec.get('page_number', None)
 
-        try:
-            src_doc = fitz.open(src_path)
-        except Exception as e:
-            print(f"[RePDFBuilding] Failed to open {src_path}: {e}")
+        if not rects:
+            # if no rects present, skip (we intentionally avoid fuzzy string matching)
+            print(f"[RePDFBuilding] No rects for section '{sec.get('section_title')}' in {fname}; skipping.")
             continue
 
-        # create a copy document in memory by inserting pages into a new doc
-        new_doc = fitz.open()
-        new_doc.insert_pdf(src_doc)  # duplicate all pages
+        for r in rects:
+            try:
+                # dict rect with page & bbox expected
+                if isinstance(r, dict) and 'page' in r and 'bbox' in r:
+                    bbox = r['bbox']
+                    if isinstance(bbox, (list, tuple)) and len(bbox) == 4:
+                        yield int(r['page']), [float(v) for v in bbox]
+                # legacy: list rect + page_hint
+                elif isinstance(r, (list, tuple)) and len(r) == 4 and page_hint:
+                    yield int(page_hint), [float(v) for v in r]
+            except Exception as e:
+                print(f"[RePDFBuilding] Unexpected error processing rect {r} for {fname}: {e}")
+                continue
 
-        modified = False
 
-        for sec in sections:
-            rects = sec.get('rects', []) or []
-            page_hint = sec.get('page_number', None)
+def _hex_color(color):
+    r, g, b = (max(0, min(255, round(float(c) * 255))) for c in (color or DEFAULT_COLOR))
+    return f"#{r:02x}{g:02x}{b:02x}"
 
-            if rects:
-                for r in rects:
-                    try:
-                        # dict rect with page & bbox expected
-                        if isinstance(r, dict) and 'page' in r and 'bbox' in r:
-                            pnum = int(r['page'])
-                            bbox = r['bbox']
-                            if pnum < 1 or pnum > len(new_doc):
-                                continue
-                            page = new_doc[pnum - 1]
-                            if not (isinstance(bbox, (list, tuple)) and len(bbox) == 4):
-                                continue
-                            rect = fitz.Rect(float(bbox[0]), float(bbox[1]), float(bbox[2]), float(bbox[3]))
-                            try:
-                                annot = page.add_highlight_annot(rect)
-                                if annot:
-                                    annot.update()
-                                    modified = True
-                            except Exception as e:
-                                print(f"[RePDFBuilding] Annot failure {fname}:{pnum} -> {e}")
-                                continue
-                        else:
-                            # legacy: list rect + page_hint
-                            if isinstance(r, (list, tuple)) and len(r) == 4 and page_hint:
-                                pnum = int(page_hint)
-                                if pnum >= 1 and pnum <= len(new_doc):
-                                    page = new_doc[pnum - 1]
-                                    rect = fitz.Rect(float(r[0]), float(r[1]), float(r[2]), float(r[3]))
-                                    try:
-                                        annot = page.add_highlight_annot(rect)
-                                        if annot:
-                                            annot.update()
-                                            modified = True
-                                    except Exception as e:
-                                        print(f"[RePDFBuilding] Legacy annot error {fname}:{pnum} -> {e}")
-                                        continue
-                    except Exception as e:
-                        print(f"[RePDFBuilding] Unexpected error processing rect {r} for {fname}: {e}")
-                        continue
-            else:
-                # if no rects present, skip (we intentionally avoid fuzzy string matching)
-                print(f"[RePDFBuilding] No rects for section '{sec.get('section_title')}' in {fname}; skipping.")
 
-        if modified:
-            ts = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
-            annotated_name = f"annotated_{ts}_{fname}"
-            annotated_path = os.path.join("uploads", annotated_name)
-            try:
-                # save annotated copy (do not overwrite original)
-                new_doc.save(annotated_path)
-                annotated_map[fname] = annotated_name
-                print(f"[RePDFBuilding] Saved annotated copy: {annotated_path}")
-            except Exception as e:
-                print(f"[RePDFBuilding] Failed to save annotated copy for {fname}: {e}")
-        else:
-            print(f"[RePDFBuilding] No modifications for {fname}; no annotated file created.")
+def highlight_layer_overlays(layers, upload_folder="uploads"):
+    """
+    Highlight rectangles for several outputs as JSON overlays the viewer draws on the original PDF,
+    instead of writing an annotated copy per query.
+    - layers: [(output, color), ...]; each output's extracted_sections become one highlight layer
+      in the given (r, g, b) colour (None: viewer yellow)
+    - The original is only opened read-only, to drop rects outside its pages and to convert each
+      bbox (top-left origin, as parsed) to PDF user space (bottom-left origin) for the viewer.
+    - Returns a mapping:
+      { "original_filename.pdf": [ {"page": 3, "bbox": [x0, y0, x1, y1], "pdf_bbox": [x0, y0, x1, y1],
+                                    "color": "#ffff00"}, ... ], ... }
+    """
+    per_file = defaultdict(list)  # fname -> [(color, sections), ...]
+    for output, color in layers:
+        for fname, sections in _group_sections(output).items():
+            per_file[fname].append((color, sections))
 
-        new_doc.close()
-        src_doc.close()
+    overlays = {}
+    for fname, file_layers in per_file.items():
+        src_path = os.path.join(upload_folder, fname)
+        if not os.path.exists(src_path):
+            print(f"[RePDFBuilding] Skipping missing file: {src_path}")
+            continue
+        try:
+            with fitz.open(src_path) as doc:
+                boxes = []
+                for color, sections in file_layers:
+                    for pnum, bbox in _section_boxes(sections, fname):
+                        if pnum < 1 or pnum > len(doc):
+                            continue
+                        pdf_rect = fitz.Rect(bbox) * ~doc[pnum - 1].transformation_matrix
+                        pdf_rect.normalize()
+                        boxes.append({"page": pnum, "bbox": bbox,
+                                      "pdf_bbox": [round(v, 2) for v in pdf_rect],
+                                      "color": _hex_color(color)})
+        except Exception as e:
+            print(f"[RePDFBuilding] Failed to build highlights for {fname}: {e}")
+            continue
+        if boxes:
+            overlays[fname] = boxes
+    return overlays
 
-    print("[RePDFBuilding] Finished highlighting. Annotated map:", annotated_map)
-    return annotated_map
+
+def highlight_overlays(output, color=None):
+    """
+    Single-layer highlight_layer_overlays: output's extracted_sections in `color`.
+    - Returns a mapping: { "original_filename.pdf": [ {"page", "bbox", "pdf_bbox", "color"}, ... ], ... }
+    """
+    return highlight_layer_overlays([(output, color)])
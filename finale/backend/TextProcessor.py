@@ -9,8 +9,9 @@ import time
 from datetime import datetime
 import numpy as np
 
-# Sentence Transformers for embeddings + util.cos_sim for mmr
-from sentence_transformers import SentenceTransformer, util
+# Sentence Transformers for embeddings; mmr runs on the stacked embedding matrix
+from sentence_transformers import SentenceTransformer
+from mmrEngine import stack_embeddings, mmr_select
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -261,24 +262,5 @@ def mmr(query_emb, sections, lambda_param=0.72, top_k=5):
     if not sections:
         return [], []
 
-    selected, remaining = [], list(range(len(sections)))
-    sim_q = [util.cos_sim(query_emb, s['embedding']).item() for s in sections]
-    sim_doc = [[util.cos_sim(sections[i]['embedding'], sections[j]['embedding']).item() for j in range(len(sections))] for i in range(len(sections))]
-
-    while len(selected) < top_k and remaining:
-        if not selected:
-            idx = int(np.argmax([sim_q[i] for i in remaining]))
-            idx = remaining[idx]
-            selected.append(idx)
-            remaining.remove(idx)
-        else:
-            mmr_scores = []
-            for idx in remaining:
-                max_sim = max(sim_doc[idx][j] for j in selected) if selected else 0
-                score = lambda_param * sim_q[idx] - (1 - lambda_param) * max_sim
-                mmr_scores.append(score)
-            chosen_rel_index = int(np.argmax(mmr_scores))
-            idx = remaining[chosen_rel_index]
-            selected.append(idx)
-            remaining.remove(idx)
-    return selected, sim_q
\ No newline at end of file
+    selected, sim_q = mmr_select(query_emb, stack_embeddings(sections), lambda_param=lambda_param, top_k=top_k)
+    return selected, sim_q.tolist()
@@ -1,57 +1,113 @@
 # app.py
 # Replace your current app.py with this file. (Only backend changes.)
-from flask import Flask, request, jsonify, send_from_directory
+from startupTiming import startup_timing, lazy_import
+startup_timing.begin("module imports")
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 import os
-from generate_audio import generate_audio
-from pydub import AudioSegment
 from werkzeug.utils import secure_filename
 import logging
 from pathlib import Path
-import fitz  # PyMuPDF
 import pandas as pd
-import joblib
-import re
-from sklearn.preprocessing import MinMaxScaler
 import time
 from datetime import datetime
 import numpy as np
-from RePDFBuilding import highlight_refined_texts
-from sentence_transformers import SentenceTransformer, util
-from llmProvider import LLMClient
-from litellm import completion
+from RePDFBuilding import highlight_overlays, highlight_layer_overlays
+from llmProvider import get_llm, llm_status
 import traceback
-from werkzeug.utils import secure_filename
-from gtts import gTTS
 import os, time, traceback
 # from nltk.corpus import wordnet
 # from nltk.tokenize import word_tokenize
 # import nltk
 import urllib.parse
 from datetime import datetime
-import azure.cognitiveservices.speech as speechsdk
-import random
-import xml.sax.saxutils as saxutils
-from RePDFBuildingNegative import highlight_refined_texts_negative
+import uuid
+import json
+import threading
+from RePDFBuildingNegative import highlight_overlays_negative, NEGATIVE_COLOR
+from sectionStore import save_section_embeddings, load_section_embeddings, EMBEDDINGS_SUFFIX
+from mmrEngine import stack_embeddings, query_similarities, mmr_select
+from vectorIndex import IVFIndex
+from pdfParser import analyze_pdf_sections, analyze_pdf_sections_batch
+from uploadCache import file_sha256, stored_filename, lookup_upload, record_upload, CACHE_DIRNAME
+from uploadJobs import UploadJobs, UPLOAD_JOB_TTL
+from streamingUpload import StreamingUploadRequest, HashingUploadStream
+from werkzeug.exceptions import RequestEntityTooLarge
+from janitor import Janitor, RetentionRule
+from fileCatalog import FileCatalog
+from llmCache import LLM_CACHE_DIR, LLM_CACHE_TTL
+from podcastAudio import (parse_script, split_narration, synthesize_podcast, encode_mp3, start_podcast_stream,
+                          podcast_backend_names, podcast_exists, follow_mp3, PODCAST_BITRATE)
+from podcastCache import PodcastCache, PodcastBusy, content_key, part_path, TTS_CACHE_DIR, TTS_CACHE_TTL
+# TTS (generate_audio, pydub, gtts, azure speech), sentence_transformers/torch, sklearn and joblib
+# are imported on first use via lazy_import
+startup_timing.end("module imports")
 # nltk.download('punkt')
 # nltk.download('punkt_tab')
 # nltk.download('wordnet')
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-# Initialize LLM client
-llm=LLMClient()
 app = Flask(__name__)
+# uploaded file parts stream straight into uploads/ (hashed and size-checked on the way)
+app.request_class = StreamingUploadRequest
 CORS(app)
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+LIBRARY_CANDIDATES = int(os.getenv("LIBRARY_CANDIDATES", "50"))  # ANN hits handed to mmr in library mode
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(MAX_FILE_SIZE * 20)))  # whole request, e.g. /upload-batch
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_FILE_SIZE'] = MAX_FILE_SIZE
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
+# an oversized file in a batch fails on its own instead of aborting the whole request
+app.config['PER_PART_SIZE_LIMIT_ENDPOINTS'] = {'upload_batch'}
+
+# library-wide section index (all uploads), fed by /upload
+section_index = IVFIndex(os.path.join(UPLOAD_FOLDER, "_index"))
+# background upload jobs (/upload?async=1)
+upload_jobs = UploadJobs(os.path.join(UPLOAD_FOLDER, "_jobs"))
+# metadata of uploads/ PDFs behind /files
+file_catalog = FileCatalog(UPLOAD_FOLDER)
+
+AUDIO_DIR = os.path.join("static", "audio")
+os.makedirs(AUDIO_DIR, exist_ok=True)
+# finished podcasts by prompt and voice settings
+podcast_cache = PodcastCache(AUDIO_DIR)
+PODCAST_JOIN_WAIT = int(os.getenv("PODCAST_JOIN_WAIT", "120"))  # seconds a request waits for an identical podcast in progress
+
+# retention for generated files: podcast audio, leftover temp files and annotated copies from
+# before highlights were sent as overlays
+ANNOTATED_MAX_AGE = int(os.getenv("ANNOTATED_MAX_AGE", str(7 * 24 * 3600)))
+ANNOTATED_MAX_BYTES = int(os.getenv("ANNOTATED_MAX_BYTES", str(2 * 1024 ** 3)))
+AUDIO_MAX_AGE = int(os.getenv("AUDIO_MAX_AGE", str(7 * 24 * 3600)))
+AUDIO_MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", str(1024 ** 3)))
+TEMP_MAX_AGE = int(os.getenv("TEMP_MAX_AGE", "3600"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+retention_rules = [
+    RetentionRule(UPLOAD_FOLDER, ["annotated_*.pdf", "annotatedNeg_*.pdf"], ANNOTATED_MAX_AGE, ANNOTATED_MAX_BYTES),
+    RetentionRule(UPLOAD_FOLDER, [".upload_*.part", "annotated*.tmp"], TEMP_MAX_AGE),
+    RetentionRule(upload_jobs.directory, ["*.json", "*.tmp"], UPLOAD_JOB_TTL),
+    RetentionRule(AUDIO_DIR, ["podcast_*.mp3", "podcast_*.json"], AUDIO_MAX_AGE, AUDIO_MAX_BYTES),
+    RetentionRule(AUDIO_DIR, [".temp_*", "*.part"], TEMP_MAX_AGE),
+]
+if LLM_CACHE_DIR:
+    # on-disk LLM response cache (expired entries are misses anyway)
+    retention_rules.append(RetentionRule(LLM_CACHE_DIR, ["*.json", "*.tmp"], LLM_CACHE_TTL, LLM_CACHE_MAX_BYTES))
+if TTS_CACHE_DIR:
+    # per-line synthesized PCM
+    retention_rules.append(RetentionRule(TTS_CACHE_DIR, ["*.pcm", "*.tmp"], TTS_CACHE_TTL, TTS_CACHE_MAX_BYTES))
+janitor = Janitor(retention_rules,
+                  on_remove=lambda path: file_catalog.remove(os.path.basename(path)) if path.endswith(".pdf") else None,
+                  lock_path=os.path.join(UPLOAD_FOLDER, ".janitor.lock"))
 
 model = None
 embedder = None
+EMBEDDING_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
 #-------------------------
 # generate contradictory
 #-------------------------
@@ -79,231 +135,44 @@ def load_model():
     global model, embedder
     model_path = "heading_classifier_with_font_count_norm_textNorm_5.pkl"
     if Path(model_path).exists():
-        model = joblib.load(model_path)
+        with startup_timing.phase("load heading classifier"):
+            model = lazy_import("joblib").load(model_path)
         logger.info("Heading classifier model loaded successfully")
     else:
         logger.warning(f"Model file {model_path} not found!")
 
     try:
+        SentenceTransformer = lazy_import("sentence_transformers", "SentenceTransformer")
         cached_path = Path("./cached_model")
-        if cached_path.exists():
-            embedder = SentenceTransformer(str(cached_path))
-            logger.info("SentenceTransformer loaded from ./cached_model")
-        else:
-            logger.info("Cached model not found. Downloading...")
-            embedder = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-            embedder.save(str(cached_path))
-            logger.info("Model downloaded and saved to ./cached_model")
+        with startup_timing.phase("load embedder"):
+            if cached_path.exists():
+                embedder = SentenceTransformer(str(cached_path))
+                logger.info("SentenceTransformer loaded from ./cached_model")
+            else:
+                logger.info("Cached model not found. Downloading...")
+                embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                embedder.save(str(cached_path))
+                logger.info("Model downloaded and saved to ./cached_model")
     except Exception as e:
         logger.exception(f"Failed to load SentenceTransformer: {e}")
         embedder = None
 
-
-# -------------------------
-# PDF text utilities
-# -------------------------
-def is_bullet_point(text):
-    text = text.strip()
-    bullet_patterns = [
-        r'^[•·▪▫▬►‣⁃]\s*', r'^\*\s+', r'^-\s+', r'^—\s+', r'^–\s+',
-        r'^\+\s+', r'^>\s+', r'^»\s+', r'^○\s+', r'^□\s+', r'^▪\s+', r'^▫\s+'
-    ]
-    for pattern in bullet_patterns:
-        if re.match(pattern, text):
-            return True
-    if re.match(r'^\d+[\.\)]\s*$', text) or re.match(r'^[a-zA-Z][\.\)]\s*$', text):
-        return True
-    if len(text) <= 3 and re.match(r'^[^\w\s]+$', text):
-        return True
-    return False
-
-def should_ignore_text(text):
-    text = text.strip()
-    if len(text) < 2:
-        return True
-    if is_bullet_point(text):
-        return True
-    if re.match(r'^\d+$', text) or re.match(r'^[a-zA-Z]$', text):
-        return True
-    artifacts = ['©', '®', '™', '...', '…']
-    if text in artifacts:
-        return True
-    return False
-
-def clean_text(text):
-    text = text.strip()
-    bullet_patterns = [
-        r'^[•·▪▫▬►‣⁃]\s*', r'^\*\s+', r'^-\s+', r'^—\s+', r'^–\s+',
-        r'^\+\s+', r'^>\s+', r'^»\s+', r'^○\s+', r'^□\s+', r'^▪\s+', r'^▫\s+'
-    ]
-    for pattern in bullet_patterns:
-        text = re.sub(pattern, '', text)
-    return text.strip()
-
-
-# -------------------------
-# analyze_pdf_sections (produces both df for classifier AND lines_list mapping)
-# -------------------------
-def extract_features(text, pdf_path, page_num, font_size, is_bold, is_italic, position_y, y_gap, start_line=None, end_line=None):
-    text_length = len(text)
-    upper_count = sum(1 for c in text if c.isupper())
-    total_alpha = sum(1 for c in text if c.isalpha())
-    capitalization_ratio = upper_count / total_alpha if total_alpha > 0 else 0
-    starts_with_numbering = bool(re.match(r'^\d+(\.\d+)*(\.|\))\s', text))
-    dot_match = re.match(r'^(\d+\.)+(\d+)', text)
-    num_dots_in_prefix = dot_match.group(1).count('.') if dot_match else 0
-
-    row = {
-        'PDF Path': str(pdf_path),
-        'Page Number': page_num,
-        'Section Text': text,
-        'Font Size': font_size,
-        'Is Bold': is_bold,
-        'Is Italic': is_italic,
-        'Text Length': text_length,
-        'Capitalization Ratio': capitalization_ratio,
-        'Starts with Numbering': starts_with_numbering,
-        'Position Y': position_y,
-        'Prefix Dot Count': num_dots_in_prefix,
-        'Y Gap': y_gap
-    }
-    # attach start/end line indexes for later mapping to rects
-    if start_line is not None:
-        row['Start Line'] = int(start_line)
-    if end_line is not None:
-        row['End Line'] = int(end_line)
-    return row
-
-def analyze_pdf_sections(pdf_path):
+def encode_texts(texts, batch_size=None):
     """
-    Parse the PDF and return:
-      - df: DataFrame of grouped rows (for classifier). Each row contains Start Line and End Line.
-      - lines_list: list of per-physical-line dicts: { line_index, page, text, bbox }
+    Encode many texts with a single SentenceTransformer.encode call.
+    Texts are sorted longest-first so each batch pads to similar lengths; rows are returned
+    in the original order as a normalized float32 (n, dim) array.
     """
-    grouped_rows = []   # will become rows for df (paragraph/group-level)
-    lines_list = []     # one entry per physical text line found in order
-    try:
-        doc = fitz.open(pdf_path)
-        line_counter = 0
-
-        for page_idx in range(doc.page_count):
-            page = doc.load_page(page_idx)
-            blocks = page.get_text("dict").get('blocks', [])
-
-            # For grouping we track a current group (list of text lines' indices and texts)
-            current_group_line_indices = []
-            current_group_texts = []
-            # representative style properties for current group (first line's style)
-            current_font_size = None
-            current_bold = None
-            current_italic = None
-            prev_line_y = None
-            prev_y_gap = None
-
-            for block in blocks:
-                if block.get('type') != 0:
-                    continue
-                for line in block.get('lines', []):
-                    spans = [s for s in line.get('spans', []) if s.get('text','').strip()]
-                    if not spans:
-                        continue
-
-                    line_text = " ".join(span['text'].strip() for span in spans)
-                    if should_ignore_text(line_text):
-                        continue
-                    cleaned = clean_text(line_text)
-                    if not cleaned:
-                        continue
-
-                    # compute bbox for the physical line (union of spans)
-                    x0 = min(s['bbox'][0] for s in spans)
-                    y0 = min(s['bbox'][1] for s in spans)
-                    x1 = max(s['bbox'][2] for s in spans)
-                    y1 = max(s['bbox'][3] for s in spans)
-                    bbox = [x0, y0, x1, y1]
-
-                    # style info from first span of the line
-                    first_span = spans[0]
-                    font_size = first_span.get('size', 0)
-                    font_flags = first_span.get('flags', 0)
-                    is_bold = (font_flags & 16) > 0
-                    is_italic = (font_flags & 2) > 0
-                    y_pos = first_span['bbox'][1]
-
-                    # always append a physical line entry
-                    lines_list.append({
-                        'line_index': line_counter,
-                        'page': page_idx + 1,
-                        'text': cleaned,
-                        'bbox': bbox,
-                    })
-                    this_line_index = line_counter
-                    line_counter += 1
-
-                    # compute y gap relative to previous line (for features)
-                    if prev_line_y is None:
-                        y_gap = None
-                    else:
-                        y_gap = abs(y_pos - prev_line_y)
-                    prev_line_y = y_pos
-
-                    # decide whether to continue the current group or start a new group
-                    if current_font_size is None:
-                        # first line in group
-                        current_group_line_indices = [this_line_index]
-                        current_group_texts = [cleaned]
-                        current_font_size = font_size
-                        current_bold = is_bold
-                        current_italic = is_italic
-                        prev_y_gap = y_gap
-                    else:
-                        same_style = (abs(current_font_size - font_size) < 0.5 and is_bold == current_bold and is_italic == current_italic)
-                        if same_style:
-                            # continue group
-                            current_group_line_indices.append(this_line_index)
-                            current_group_texts.append(cleaned)
-                        else:
-                            # finalize previous group into one grouped row
-                            full_text = " ".join(current_group_texts)
-                            if not should_ignore_text(full_text) and len(full_text.strip()) > 2:
-                                start_line = current_group_line_indices[0]
-                                end_line = current_group_line_indices[-1]
-                                feat = extract_features(full_text, pdf_path, page_idx + 1,
-                                                        current_font_size, current_bold, current_italic,
-                                                        prev_line_y, prev_y_gap, start_line=start_line, end_line=end_line)
-                                grouped_rows.append(feat)
-                            # start new group with this line
-                            current_group_line_indices = [this_line_index]
-                            current_group_texts = [cleaned]
-                            current_font_size = font_size
-                            current_bold = is_bold
-                            current_italic = is_italic
-                            prev_y_gap = y_gap
-
-            # finalize group's leftover at end of page
-            if current_group_texts:
-                full_text = " ".join(current_group_texts)
-                if not should_ignore_text(full_text) and len(full_text.strip()) > 2:
-                    start_line = current_group_line_indices[0]
-                    end_line = current_group_line_indices[-1]
-                    feat = extract_features(full_text, pdf_path, page_idx + 1,
-                                            current_font_size, current_bold, current_italic,
-                                            prev_line_y, prev_y_gap, start_line=start_line, end_line=end_line)
-                    grouped_rows.append(feat)
-                # reset for next page
-                current_group_line_indices = []
-                current_group_texts = []
-                current_font_size = None
-                current_bold = None
-                current_italic = None
-                prev_y_gap = None
-
-        doc.close()
-    except Exception as e:
-        logger.exception(f"Error processing {pdf_path}: {e}")
-
-    df = pd.DataFrame(grouped_rows)
-    return df, lines_list
+    if not texts:
+        return np.zeros((0, embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    encoded = embedder.encode([texts[i] for i in order],
+                              batch_size=batch_size or EMBED_BATCH_SIZE,
+                              normalize_embeddings=True,
+                              convert_to_numpy=True)
+    embeddings = np.empty_like(encoded, dtype=np.float32)
+    embeddings[order] = encoded
+    return embeddings
 
 
 # -------------------------
@@ -324,6 +193,7 @@ def preprocess_features(df):
 
     df['Font Size Normalised'] = df['Font Size']
     columns_to_normalize = ['Font Size Normalised', 'Text Length', 'Capitalization Ratio', 'Position Y']
+    MinMaxScaler = lazy_import("sklearn.preprocessing", "MinMaxScaler")
     if len(df) > 0:
         scaler = MinMaxScaler()
         df[columns_to_normalize] = scaler.fit_transform(df[columns_to_normalize])
@@ -380,35 +250,304 @@ def mmr(query_emb, sections, lambda_param, top_k, isContra=0):
     if not sections:
         return [], []
 
-    selected, remaining = [], list(range(len(sections)))
-    sim_q = [util.cos_sim(query_emb, s['embedding']).item() for s in sections]
-    sim_doc = [
-                [util.cos_sim(sections[i]['embedding'], sections[j]['embedding']).item() for j in range(len(sections))]
-                for i in range(len(sections))
-            ]
+    matrix = stack_embeddings(sections)
 
     if isContra:  # only return indices with similarity < 0
-        contra_indices = [i for i, score in enumerate(sim_q) if score < 0]
-        return contra_indices, sim_q
+        sim_q = query_similarities(query_emb, matrix)
+        contra_indices = [int(i) for i in np.flatnonzero(sim_q < 0)]
+        return contra_indices, sim_q.tolist()
 
     # normal mmr
-    while len(selected) < top_k and remaining:
-        if not selected:
-            idx = int(np.argmax([sim_q[i] for i in remaining]))
-            idx = remaining[idx]
-            selected.append(idx)
-            remaining.remove(idx)
-        else:
-            mmr_scores = []
-            for idx in remaining:
-                max_sim = max(sim_doc[idx][j] for j in selected) if selected else 0
-                score = lambda_param * sim_q[idx] - (1 - lambda_param) * max_sim
-                mmr_scores.append(score)
-            chosen_rel_index = int(np.argmax(mmr_scores))
-            idx = remaining[chosen_rel_index]
-            selected.append(idx)
-            remaining.remove(idx)
-    return selected, sim_q
+    selected, sim_q = mmr_select(query_emb, matrix, lambda_param=lambda_param, top_k=top_k)
+    return selected, sim_q.tolist()
+
+# -------------------------
+# section gathering for the query routes
+# -------------------------
+def parse_section_item(item):
+    """
+    Normalise one section/outline item into a section_data row (without Document/embedding).
+    Accepts /upload sections ({heading, text, ...}), outline entries ({text, level, page}) or plain strings.
+    """
+    if isinstance(item, dict) and 'text' in item and 'heading' in item:
+        heading = item['heading']
+        full_text = item['text']
+        page = item.get('page')
+        rects = item.get('rects', [])
+        start_line = item.get('start_line')
+        end_line = item.get('end_line')
+        start_page = item.get('start_page')
+        end_page = item.get('end_page')
+    elif isinstance(item, dict) and 'text' in item and 'level' in item:
+        heading = item['text']
+        full_text = item['text']
+        page = item.get('page')
+        rects = []
+        start_line = end_line = start_page = end_page = None
+    else:
+        heading = item.get('heading') if isinstance(item, dict) else str(item)
+        full_text = item.get('text') if isinstance(item, dict) else heading
+        page = item.get('page') if isinstance(item, dict) else None
+        rects = item.get('rects') if isinstance(item, dict) else []
+        start_line = item.get('start_line') if isinstance(item, dict) else None
+        end_line = item.get('end_line') if isinstance(item, dict) else None
+        start_page = item.get('start_page') if isinstance(item, dict) else None
+        end_page = item.get('end_page') if isinstance(item, dict) else None
+
+    return {
+        'Page': page if page is not None else -1,
+        'heading': heading,
+        'text': full_text,
+        'rects': rects,
+        'start_line': start_line,
+        'end_line': end_line,
+        'start_page': start_page,
+        'end_page': end_page
+    }
+
+def parse_text_section_item(item):
+    """Stricter parser used by the negative route: only dict items carrying 'text' are kept."""
+    if not (isinstance(item, dict) and 'text' in item):
+        return None
+    page = item.get('page')
+    return {
+        'Page': page if page is not None else -1,
+        'heading': item.get('heading') or item.get('text'),
+        'text': item['text'],
+        'rects': item.get('rects', []),
+        'start_line': item.get('start_line'),
+        'end_line': item.get('end_line'),
+        'start_page': item.get('start_page'),
+        'end_page': item.get('end_page')
+    }
+
+def gather_section_data(documents, item_parser=parse_section_item):
+    """
+    Build the section_data rows (with embeddings) for the documents sent by the client.
+    Documents uploaded through /upload are looked up by filename in the server-side section store,
+    so only documents without stored embeddings get their client-supplied sections encoded here,
+    all of them in one batched encode call.
+    """
+    section_data = []
+    pending = []  # rows from client-supplied sections that still need an embedding
+    for doc in documents:
+        filename = doc.get('filename') or doc.get('serverFilename') or doc.get('name')
+
+        stored = load_section_embeddings(app.config['UPLOAD_FOLDER'], secure_filename(filename)) if filename else None
+        if stored is not None:
+            sections_list, embeddings = stored
+            for item, emb in zip(sections_list, embeddings):
+                row = item_parser(item)
+                if row is None:
+                    continue
+                row['Document'] = filename
+                row['embedding'] = emb
+                section_data.append(row)
+            continue
+
+        sections_list = doc.get('sections')
+        if not sections_list:
+            outline_obj = doc.get('outline') or {}
+            sections_list = outline_obj.get('outline') if isinstance(outline_obj, dict) else None
+        if not sections_list:
+            continue
+
+        for item in sections_list:
+            row = item_parser(item)
+            if row is None:
+                continue
+            row['Document'] = filename
+            section_data.append(row)
+            pending.append(row)
+
+    if pending:
+        embeddings = encode_texts([row['text'] for row in pending])
+        for row, emb in zip(pending, embeddings):
+            row['embedding'] = emb
+    return section_data
+
+def backfill_section_index():
+    """Add every stored upload that the library index has not seen yet (e.g. uploads made before it existed)."""
+    added = 0
+    for name in os.listdir(app.config['UPLOAD_FOLDER']):
+        if not name.endswith(EMBEDDINGS_SUFFIX):
+            continue
+        filename = name[:-len(EMBEDDINGS_SUFFIX)]
+        if filename in section_index.filenames:
+            continue
+        stored = load_section_embeddings(app.config['UPLOAD_FOLDER'], filename)
+        if stored is not None:
+            # may run in the preloading master, which must not start threads before it forks
+            added += section_index.add(filename, stored[1], background=False)
+    if added:
+        logger.info(f"Backfilled {added} sections into the library index")
+
+def wants_stream(data=None):
+    """?stream=1 (or "stream": true in the JSON body) asks for server-sent events."""
+    flag = request.args.get('stream')
+    if flag is None and isinstance(data, dict):
+        flag = data.get('stream')
+    return str(flag or '').lower() in ('1', 'true', 'yes')
+
+def stream_llm(prompt, result_key):
+    """
+    SSE response for an LLM generation: one {"delta": ...} event per chunk as it arrives,
+    then an "done" event carrying {result_key: full text} (the non-streaming JSON body),
+    or an "error" event.
+    """
+    def events():
+        parts = []
+        try:
+            for chunk in get_llm().generate_stream(prompt):
+                parts.append(chunk)
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            yield f"event: done\ndata: {json.dumps({result_key: ''.join(parts).strip()})}\n\n"
+        except Exception as e:
+            logger.exception("Error while streaming LLM response")
+            yield f"event: error\ndata: {json.dumps({'error': 'Internal server error', 'details': str(e)})}\n\n"
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def library_section_data(query_embedding, top_n=None, item_parser=parse_section_item):
+    """
+    Build section_data rows for the top_n library sections nearest to the query, using the
+    IVF index instead of a client-supplied documents list. Rows come from the section store,
+    shaped by item_parser like gather_section_data's.
+    """
+    hits = section_index.search(query_embedding, top_k=top_n or LIBRARY_CANDIDATES)
+    by_file = {}
+    for fname, sec_idx, _score in hits:
+        by_file.setdefault(fname, []).append(sec_idx)
+
+    section_data = []
+    for fname, indices in by_file.items():
+        stored = load_section_embeddings(app.config['UPLOAD_FOLDER'], fname)
+        if stored is None:
+            continue
+        sections_list, embeddings = stored
+        for sec_idx in indices:
+            if sec_idx >= len(sections_list):
+                continue
+            row = item_parser(sections_list[sec_idx])
+            if row is None:
+                continue
+            row['Document'] = fname
+            row['embedding'] = embeddings[sec_idx]
+            section_data.append(row)
+    return section_data
+
+#--------------------------------------- #
+#     worker start-up & readiness        #
+#--------------------------------------- #
+WARMUP_WAIT = float(os.getenv("WARMUP_WAIT", "30"))  # seconds a model route waits for warm-up before 503
+# routes that need the classifier/embedder; they are held back until warm-up has finished
+MODEL_ENDPOINTS = {'upload_pdf', 'upload_batch', 'pdf_query', 'pdf_query_negative', 'role_query'}
+
+_worker_lock = threading.Lock()
+_worker = {"pid": None, "stage": "not started", "error": None, "ready": threading.Event()}
+
+def warm_up():
+    """Run a dummy encode and predict so the first real request doesn't pay for lazy kernel/thread-pool init."""
+    with startup_timing.phase("warm-up"):
+        if embedder is not None:
+            embedder.encode("warm up", normalize_embeddings=True)
+            encode_texts(["warm up the batch encoder", "warm up"])
+        if model is not None:
+            model.predict(pd.DataFrame([[0.0] * len(HEADING_FEATURES)], columns=HEADING_FEATURES))
+
+def load_shared_state():
+    """
+    Everything workers only read: classifier, embedder, library index backfill.
+    Called in the master before forking when preloading (weights then shared copy-on-write),
+    otherwise by each worker; models already present are not loaded again.
+    """
+    if model is None or embedder is None:
+        load_model()
+    backfill_section_index()
+
+def _start_worker():
+    try:
+        _worker["stage"] = "loading models"
+        load_shared_state()
+        # after the fork: a SQLite connection must not be inherited from a preloading master
+        if file_catalog.is_empty():
+            file_catalog.backfill(os.path.join(UPLOAD_FOLDER, CACHE_DIRNAME))
+        # load_model only logs a missing .pkl or embedder; a worker without them must not report ready
+        missing = [name for name, obj in (("heading classifier", model), ("embedder", embedder)) if obj is None]
+        if missing:
+            raise RuntimeError(f"Not loaded: {', '.join(missing)}")
+        _worker["stage"] = "warming up"
+        warm_up()
+        _worker["stage"] = "ready"
+    except Exception as e:
+        logger.exception("Worker start-up failed")
+        _worker["stage"] = "failed"
+        _worker["error"] = str(e)
+    finally:
+        # also set on failure: waiting requests then see the missing model instead of hanging
+        _worker["ready"].set()
+        startup_timing.report()
+
+def init_worker(background=True):
+    """
+    Per-process start-up hook: start this process's janitor, load the classifier and embedder unless
+    preloaded, backfill the library index and catalog, then warm up. Runs once per process (a forked
+    child runs it again for itself); with background=True the server can already answer /health and
+    /ready meanwhile.
+    """
+    with _worker_lock:
+        if _worker["pid"] == os.getpid():
+            return
+        _worker.update(pid=os.getpid(), stage="starting", error=None, ready=threading.Event())
+    # every worker runs one; only the holder of the janitor lock sweeps
+    janitor.start()
+    if background:
+        threading.Thread(target=_start_worker, name="worker-init", daemon=True).start()
+    else:
+        _start_worker()
+
+def is_ready():
+    return (_worker["pid"] == os.getpid() and _worker["stage"] == "ready"
+            and model is not None and embedder is not None)
+
+@app.before_request
+def gate_until_warm():
+    # servers that never call init_worker explicitly start it with their first request
+    init_worker()
+    if request.method != 'OPTIONS' and request.endpoint in MODEL_ENDPOINTS and not _worker["ready"].wait(WARMUP_WAIT):
+        return jsonify({"error": "Server is warming up, retry shortly", "stage": _worker["stage"]}), 503, \
+            {"Retry-After": "5"}
+
+#--------------------------------------- #
+#     health                             #
+#--------------------------------------- #
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once models are loaded and warmed up in this worker, 503 before."""
+    body = {"ready": is_ready(), "stage": _worker["stage"], "pid": os.getpid()}
+    if _worker["error"]:
+        body["error"] = _worker["error"]
+    return jsonify(body), 200 if body["ready"] else 503
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness plus component readiness. The LLM client is created lazily; ?check_llm=1 builds it
+    now and reports whether the configured provider could be initialised.
+    """
+    check_llm = str(request.args.get('check_llm', '')).lower() in ('1', 'true', 'yes')
+    return jsonify({
+        "status": "healthy",
+        "message": "PDF Analysis API is running",
+        "version": "1.0.0",
+        "components": {
+            "heading_model": model is not None,
+            "embedder": embedder is not None,
+            "warmed_up": is_ready(),
+            "llm": llm_status(initialize=check_llm)
+        },
+        "startup": startup_timing.snapshot()
+    })
 
 #--------------------------------------- #
 #     only to upload file                #
@@ -416,6 +555,10 @@ def mmr(query_emb, sections, lambda_param, top_k, isContra=0):
 @app.route('/upload-only-file', methods=['POST'])
 def upload_only_file():
     try:
+        # reject before the body is read when the client announces an oversized upload
+        if request.content_length and request.content_length > MAX_FILE_SIZE:
+            return jsonify({"error": "File too large. Maximum size is 50MB"}), 400
+
         if 'pdf' not in request.files:
             return jsonify({"error": "No file provided"}), 400
 
@@ -426,25 +569,304 @@ def upload_only_file():
         if file and '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
             return jsonify({"error": "Invalid file type. Only PDF files are allowed"}), 400
 
-        if request.content_length and request.content_length > MAX_FILE_SIZE:
-            return jsonify({"error": "File too large. Maximum size is 50MB"}), 400
-
-        filename = secure_filename(file.filename)
-        
-        
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        logger.info(f"Uploaded file: {filename}")
+        # content-hash name like /upload: a user's "annotated_x.pdf" must not look like a derived copy
+        digest, _cached, filename, filepath = stash_upload(file)
+        file_catalog.record(filename, os.path.getsize(filepath), digest=digest, original_name=file.filename)
         return jsonify({"filename": filename, "filepath": filepath}), 200
+    except RequestEntityTooLarge:
+        return jsonify({"error": "File too large. Maximum size is 50MB"}), 413
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
         return jsonify({"error": "Error uploading file"}), 500
 #--------------------------------------- #
+# upload pipeline stages (shared by /upload, async jobs and batch ingest)
+#--------------------------------------- #
+HEADING_FEATURES = [
+    'Font Ratio', 'Font Size Rank', 'Text Length', 'Capitalization Ratio',
+    'Position Y', 'Is Bold', 'Is Italic',
+    'Starts with Numbering', 'Font Size Count', 'Is Unique Font Size'
+]
+
+class UploadError(Exception):
+    """Processing failure that maps to a JSON {"error": message} response with the given status."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def build_sections(df, lines_list):
+    """
+    Build sections mapping using Title/H1/H2 as section starts (but use Start/End Line indices
+    from grouped df rows to collect all physical lines for the full section body)
+    """
+    sections = []
+    final_df = df.reset_index(drop=True)
+    section_labels = ['Title', 'H1', 'H2']
+    for i, row in final_df.iterrows():
+        if row['Label'] in section_labels:
+            heading = row['Section Text']
+            # collect grouped rows texts until next heading
+            body_rows = []
+            body_start_line = None
+            body_end_line = None
+            for j in range(i + 1, len(final_df)):
+                next_row = final_df.iloc[j]
+                if next_row['Label'] in section_labels:
+                    break
+                body_rows.append(next_row['Section Text'])
+                # get start/end line indices if present
+                sline = next_row.get('Start Line', None)
+                eline = next_row.get('End Line', None)
+                if sline is not None:
+                    if body_start_line is None:
+                        body_start_line = int(sline)
+                    body_end_line = int(eline) if eline is not None else body_end_line
+
+            # If there were no body grouped rows, include nothing (heading-only)
+            # But always include heading text.
+            full_text = heading + (" " + " ".join(body_rows) if body_rows else "")
+
+            # Compute page numbers:
+            start_line = int(row.get('Start Line', -1)) if 'Start Line' in row else -1
+            end_line = body_end_line if body_end_line is not None else (int(row.get('End Line', -1)) if 'End Line' in row else start_line)
+            start_page = None
+            end_page = None
+            if start_line >= 0 and start_line < len(lines_list):
+                start_page = lines_list[start_line]['page']
+            if end_line is not None and end_line >= 0 and end_line < len(lines_list):
+                end_page = lines_list[end_line]['page']
+
+            # Gather all physical line indices for this section:
+            collected_line_indices = []
+            # include heading group lines:
+            if start_line is not None and start_line >= 0:
+                # find the grouped row for the heading (it had Start/End Line)
+                heading_sline = int(row.get('Start Line', start_line))
+                heading_eline = int(row.get('End Line', start_line))
+                collected_line_indices.extend(list(range(heading_sline, heading_eline + 1)))
+            # include body grouped lines by collecting the Start/End ranges for each body grouped row
+            if body_rows:
+                for j in range(i + 1, i + 1 + len(body_rows)):
+                    br = final_df.iloc[j]
+                    bs = br.get('Start Line', None)
+                    be = br.get('End Line', None)
+                    if bs is not None and be is not None:
+                        collected_line_indices.extend(list(range(int(bs), int(be) + 1)))
+
+            # make per-page union bounding boxes from collected_line_indices
+            page_to_box = {}
+            for li in collected_line_indices:
+                if li is None or li < 0 or li >= len(lines_list):
+                    continue
+                rec = lines_list[li]
+                p = rec['page']
+                bbox = rec['bbox']
+                if p not in page_to_box:
+                    page_to_box[p] = {
+                        'x0': bbox[0],
+                        'y0': bbox[1],
+                        'x1': bbox[2],
+                        'y1': bbox[3]
+                    }
+                else:
+                    pb = page_to_box[p]
+                    pb['x0'] = min(pb['x0'], bbox[0])
+                    pb['y0'] = min(pb['y0'], bbox[1])
+                    pb['x1'] = max(pb['x1'], bbox[2])
+                    pb['y1'] = max(pb['y1'], bbox[3])
+
+            rects = []
+            for p, box in page_to_box.items():
+                rects.append({
+                    "page": int(p),
+                    "bbox": [float(box['x0']), float(box['y0']), float(box['x1']), float(box['y1'])]
+                })
+
+            sections.append({
+                "heading": heading,
+                "text": full_text,
+                "page": start_page if start_page is not None else int(row.get('Page Number', 1)),
+                "start_line": start_line,
+                "start_page": start_page,
+                "end_line": end_line,
+                "end_page": end_page,
+                "rects": rects
+            })
+    return sections
+
+def store_section_embeddings(filename, sections, embeddings=None):
+    """
+    Embed sections once at upload so the query routes only need to encode the query.
+    Batch ingest passes embeddings it already computed for several files in one encode call.
+    """
+    if embedder is None or not sections:
+        return 0
+    try:
+        if embeddings is None:
+            embeddings = encode_texts([s['text'] for s in sections])
+        save_section_embeddings(app.config['UPLOAD_FOLDER'], filename, sections, embeddings,
+                                model_name=EMBEDDING_MODEL_NAME)
+        section_index.add(filename, embeddings)
+        return len(sections)
+    except Exception as e:
+        # queries fall back to encoding the client-supplied sections
+        logger.exception(f"Failed to store section embeddings for {filename}: {e}")
+        return 0
+
+def process_upload(filepath, filename, digest, progress=None):
+    """
+    Run parse -> classify -> build sections -> embed for a stored upload and return the
+    /upload response payload. progress(stage, done, total) is called as stages advance,
+    with stage one of 'pages_parsed', 'rows_classified', 'sections_embedded'.
+    Raises UploadError (after removing the stored file) when the PDF cannot be processed.
+    """
+    def report(stage, done, total):
+        if progress is not None:
+            progress(stage, done, total)
+
+    if model is None:
+        os.remove(filepath)
+        raise UploadError("Model not loaded", 500)
+
+    # analyze: get grouped df (for classifier) and lines_list (per-line bboxes)
+    df, lines_list = analyze_pdf_sections(filepath, progress=lambda done, total: report('pages_parsed', done, total))
+    if (df is None or df.empty) and not lines_list:
+        os.remove(filepath)
+        raise UploadError("No extractable text", 400)
+
+    df = preprocess_features(df)
+    if df.empty:
+        os.remove(filepath)
+        raise UploadError("Preprocessing failed", 400)
+
+    report('rows_classified', 0, len(df))
+    df['Label'] = model.predict(df[HEADING_FEATURES])
+    report('rows_classified', len(df), len(df))
+
+    structured_json = build_json_from_predictions(df)
+    sections = build_sections(df, lines_list)
+
+    report('sections_embedded', 0, len(sections))
+    embedded = store_section_embeddings(filename, sections)
+    report('sections_embedded', embedded, len(sections))
+
+    return finish_upload(filename, digest, structured_json, sections)
+
+def finish_upload(filename, digest, structured_json, sections):
+    """Build the /upload response payload and remember it under the content hash."""
+    response_payload = {
+        "success": True,
+        "filename": filename,
+        "outline": structured_json,
+        "sections": sections,
+        "message": f"Successfully processed PDF and found {len(structured_json['outline'])} headings and {len(sections)} sections"
+    }
+    record_upload(app.config['UPLOAD_FOLDER'], digest, response_payload)
+    file_catalog.record(filename, os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], filename)),
+                        digest=digest, original_name=filename.split('_', 1)[-1],
+                        outline_count=len(structured_json['outline']), section_count=len(sections))
+    return response_payload
+
+def process_upload_batch(items):
+    """
+    Batch version of process_upload for items [{filepath, filename, digest}, ...].
+    All files are parsed together on the process pool, preprocessed per file (feature scaling is
+    per document), classified with one model.predict over the concatenated rows, and all their
+    sections are embedded in one encode call. Returns one payload or {"success": False, "error"}
+    per item, in order.
+    """
+    results = [None] * len(items)
+    if model is None:
+        for i, item in enumerate(items):
+            os.remove(item['filepath'])
+            results[i] = {"success": False, "error": "Model not loaded"}
+        return results
+
+    parsed = analyze_pdf_sections_batch([item['filepath'] for item in items])
+    ready = []  # (item index, preprocessed df, lines_list)
+    for i, (item, (df, lines_list)) in enumerate(zip(items, parsed)):
+        if (df is None or df.empty) and not lines_list:
+            os.remove(item['filepath'])
+            results[i] = {"success": False, "error": "No extractable text"}
+            continue
+        df = preprocess_features(df)
+        if df.empty:
+            os.remove(item['filepath'])
+            results[i] = {"success": False, "error": "Preprocessing failed"}
+            continue
+        ready.append((i, df, lines_list))
+
+    if not ready:
+        return results
+
+    labels = model.predict(pd.concat([df[HEADING_FEATURES] for _, df, _ in ready], ignore_index=True))
+    built = []  # (item index, structured_json, sections)
+    offset = 0
+    for i, df, lines_list in ready:
+        df['Label'] = labels[offset:offset + len(df)]
+        offset += len(df)
+        built.append((i, build_json_from_predictions(df), build_sections(df, lines_list)))
+
+    all_embeddings = None
+    if embedder is not None:
+        try:
+            all_embeddings = encode_texts([sec['text'] for _, _, sections in built for sec in sections])
+        except Exception as e:
+            logger.exception(f"Batch embedding failed: {e}")
+
+    offset = 0
+    for i, structured_json, sections in built:
+        embeddings = all_embeddings[offset:offset + len(sections)] if all_embeddings is not None else None
+        offset += len(sections)
+        store_section_embeddings(items[i]['filename'], sections, embeddings=embeddings)
+        results[i] = finish_upload(items[i]['filename'], items[i]['digest'], structured_json, sections)
+    return results
+
+def stash_upload(file):
+    """
+    Store an uploaded file under its content-hash name.
+    Returns (digest, cached_payload, filename, filepath); on a cache hit nothing new is stored
+    and cached_payload is the earlier /upload response.
+    """
+    stream = file.stream
+    if isinstance(stream, HashingUploadStream):
+        # already on disk in uploads/ and hashed while it was received
+        digest = stream.hexdigest()
+        tmp_path = stream.path
+    else:
+        # save under a temp name first: the stored name is derived from the content hash
+        tmp_path = os.path.join(app.config['UPLOAD_FOLDER'], f".upload_{uuid.uuid4().hex}.part")
+        file.save(tmp_path)
+        digest = file_sha256(tmp_path)
+
+    cached = lookup_upload(app.config['UPLOAD_FOLDER'], digest)
+    if cached is not None:
+        if isinstance(stream, HashingUploadStream):
+            stream.discard()
+        else:
+            os.remove(tmp_path)
+        logger.info(f"Upload cache hit for {file.filename}: {cached['filename']}")
+        return digest, cached, cached['filename'], os.path.join(app.config['UPLOAD_FOLDER'], cached['filename'])
+
+    filename = stored_filename(digest, secure_filename(file.filename))
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if isinstance(stream, HashingUploadStream):
+        stream.commit(filepath)
+    else:
+        os.replace(tmp_path, filepath)
+    logger.info(f"Uploaded file: {filename}")
+    return digest, None, filename, filepath
+
+#--------------------------------------- #
 # upload endpoint: builds sections using df rows' Start/End line indices
 #--------------------------------------- #
 @app.route('/upload', methods=['POST'])
 def upload_pdf():
     try:
+        # reject before the body is read when the client announces an oversized upload
+        if request.content_length and request.content_length > MAX_FILE_SIZE:
+            return jsonify({"error": "File too large. Maximum size is 50MB"}), 400
+
         if 'file' not in request.files:
             return jsonify({"error": "No file provided"}), 400
 
@@ -455,150 +877,116 @@ def upload_pdf():
         if file and '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
             return jsonify({"error": "Invalid file type. Only PDF files are allowed"}), 400
 
-        if request.content_length and request.content_length > MAX_FILE_SIZE:
-            return jsonify({"error": "File too large. Maximum size is 50MB"}), 400
-
-        filename = secure_filename(file.filename)
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        logger.info(f"Uploaded file: {filename}")
-
-        if model is None:
-            os.remove(filepath)
-            return jsonify({"error": "Model not loaded"}), 500
+        # async mode: return a job id at once and process in the background worker pool
+        wants_async = str(request.args.get('async') or request.form.get('async') or '').lower() in ('1', 'true', 'yes')
+
+        digest, cached, filename, filepath = stash_upload(file)
+        if cached is not None:
+            return jsonify({**cached, "cached": True})
+
+        if wants_async:
+            job_id = upload_jobs.submit(process_upload, filepath, filename, digest, error_type=UploadError)
+            return jsonify({
+                "success": True,
+                "job_id": job_id,
+                "filename": filename,
+                "status_url": f"/upload/status/{job_id}"
+            }), 202
+
+        try:
+            response_payload = process_upload(filepath, filename, digest)
+        except UploadError as e:
+            return jsonify({"error": e.message}), e.status
+        return jsonify(response_payload)
 
-        # analyze: get grouped df (for classifier) and lines_list (per-line bboxes)
-        df, lines_list = analyze_pdf_sections(filepath)
-        if (df is None or df.empty) and not lines_list:
-            os.remove(filepath)
-            return jsonify({"error": "No extractable text"}), 400
+    except RequestEntityTooLarge:
+        return jsonify({"error": "File too large. Maximum size is 50MB"}), 413
+    except Exception as e:
+        logger.exception(f"Error processing upload: {str(e)}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
-        df = preprocess_features(df)
-        if df.empty:
-            os.remove(filepath)
-            return jsonify({"error": "Preprocessing failed"}), 400
-
-        features = [
-            'Font Ratio', 'Font Size Rank', 'Text Length', 'Capitalization Ratio',
-            'Position Y', 'Is Bold', 'Is Italic',
-            'Starts with Numbering', 'Font Size Count', 'Is Unique Font Size'
-        ]
-        df['Label'] = model.predict(df[features])
-
-        structured_json = build_json_from_predictions(df)
-
-        # Build sections mapping using Title/H1/H2 as section starts (but use Start/End Line indices
-        # from grouped df rows to collect all physical lines for the full section body)
-        sections = []
-        final_df = df.reset_index(drop=True)
-        section_labels = ['Title', 'H1', 'H2']
-        for i, row in final_df.iterrows():
-            if row['Label'] in section_labels:
-                heading = row['Section Text']
-                # collect grouped rows texts until next heading
-                body_rows = []
-                body_start_line = None
-                body_end_line = None
-                for j in range(i + 1, len(final_df)):
-                    next_row = final_df.iloc[j]
-                    if next_row['Label'] in section_labels:
-                        break
-                    body_rows.append(next_row['Section Text'])
-                    # get start/end line indices if present
-                    sline = next_row.get('Start Line', None)
-                    eline = next_row.get('End Line', None)
-                    if sline is not None:
-                        if body_start_line is None:
-                            body_start_line = int(sline)
-                        body_end_line = int(eline) if eline is not None else body_end_line
-
-                # If there were no body grouped rows, include nothing (heading-only)
-                # But always include heading text.
-                full_text = heading + (" " + " ".join(body_rows) if body_rows else "")
-
-                # Compute page numbers:
-                start_line = int(row.get('Start Line', -1)) if 'Start Line' in row else -1
-                end_line = body_end_line if body_end_line is not None else (int(row.get('End Line', -1)) if 'End Line' in row else start_line)
-                start_page = None
-                end_page = None
-                if start_line >= 0 and start_line < len(lines_list):
-                    start_page = lines_list[start_line]['page']
-                if end_line is not None and end_line >= 0 and end_line < len(lines_list):
-                    end_page = lines_list[end_line]['page']
-
-                # Gather all physical line indices for this section:
-                collected_line_indices = []
-                # include heading group lines:
-                if start_line is not None and start_line >= 0:
-                    # find the grouped row for the heading (it had Start/End Line)
-                    heading_sline = int(row.get('Start Line', start_line))
-                    heading_eline = int(row.get('End Line', start_line))
-                    collected_line_indices.extend(list(range(heading_sline, heading_eline + 1)))
-                # include body grouped lines by collecting the Start/End ranges for each body grouped row
-                if body_rows:
-                    for j in range(i + 1, i + 1 + len(body_rows)):
-                        br = final_df.iloc[j]
-                        bs = br.get('Start Line', None)
-                        be = br.get('End Line', None)
-                        if bs is not None and be is not None:
-                            collected_line_indices.extend(list(range(int(bs), int(be) + 1)))
-
-                # make per-page union bounding boxes from collected_line_indices
-                page_to_box = {}
-                for li in collected_line_indices:
-                    if li is None or li < 0 or li >= len(lines_list):
-                        continue
-                    rec = lines_list[li]
-                    p = rec['page']
-                    bbox = rec['bbox']
-                    if p not in page_to_box:
-                        page_to_box[p] = {
-                            'x0': bbox[0],
-                            'y0': bbox[1],
-                            'x1': bbox[2],
-                            'y1': bbox[3]
-                        }
-                    else:
-                        pb = page_to_box[p]
-                        pb['x0'] = min(pb['x0'], bbox[0])
-                        pb['y0'] = min(pb['y0'], bbox[1])
-                        pb['x1'] = max(pb['x1'], bbox[2])
-                        pb['y1'] = max(pb['y1'], bbox[3])
-
-                rects = []
-                for p, box in page_to_box.items():
-                    rects.append({
-                        "page": int(p),
-                        "bbox": [float(box['x0']), float(box['y0']), float(box['x1']), float(box['y1'])]
-                    })
-
-                sections.append({
-                    "heading": heading,
-                    "text": full_text,
-                    "page": start_page if start_page is not None else int(row.get('Page Number', 1)),
-                    "start_line": start_line,
-                    "start_page": start_page,
-                    "end_line": end_line,
-                    "end_page": end_page,
-                    "rects": rects
-                })
+#--------------------------------------- #
+# batch ingest: many PDFs in one request #
+#--------------------------------------- #
+@app.route('/upload-batch', methods=['POST'])
+def upload_batch():
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if not files:
+            return jsonify({"error": "No files provided"}), 400
+
+        results = [None] * len(files)
+        items, item_positions = [], []
+        first_by_digest = {}  # the same content twice in one batch is processed once
+        duplicates = []
+        for pos, file in enumerate(files):
+            if file.filename == '':
+                results[pos] = {"success": False, "error": "No file selected"}
+                continue
+            if '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
+                results[pos] = {"success": False, "error": "Invalid file type. Only PDF files are allowed"}
+                continue
 
-        response_payload = {
-            "success": True,
-            "filename": filename,
-            "outline": structured_json,
-            "sections": sections,
-            "message": f"Successfully processed PDF and found {len(structured_json['outline'])} headings and {len(sections)} sections"
-        }
+            if getattr(file.stream, 'too_large', False):
+                results[pos] = {"success": False, "error": "File too large. Maximum size is 50MB"}
+                continue
 
-        return jsonify(response_payload)
+            digest, cached, filename, filepath = stash_upload(file)
+            if cached is not None:
+                results[pos] = {**cached, "cached": True}
+            elif digest in first_by_digest:
+                duplicates.append((pos, first_by_digest[digest]))
+            else:
+                first_by_digest[digest] = pos
+                items.append({"filepath": filepath, "filename": filename, "digest": digest})
+                item_positions.append(pos)
+
+        for pos, result in zip(item_positions, process_upload_batch(items)):
+            results[pos] = result
+        for pos, first_pos in duplicates:
+            results[pos] = dict(results[first_pos])
+
+        for file, result in zip(files, results):
+            result['original_filename'] = file.filename
+        succeeded = sum(1 for r in results if r.get('success'))
+        return jsonify({
+            "success": succeeded > 0,
+            "results": results,
+            "count": len(results),
+            "message": f"Processed {succeeded} of {len(results)} PDFs"
+        })
 
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Upload too large. A batch may be at most {MAX_REQUEST_SIZE // (1024 * 1024)}MB"}), 413
     except Exception as e:
-        logger.exception(f"Error processing upload: {str(e)}")
+        logger.exception(f"Error processing batch upload: {str(e)}")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
+@app.route('/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """
+    Status of an async upload job: status (queued/running/done/failed), per-stage progress,
+    and the usual /upload payload as 'result' once done. ?stream=1 sends the same record as
+    server-sent events on every change until the job finishes.
+    """
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+
+    def public(record):
+        return {k: v for k, v in record.items() if k not in ('version', 'owner')}
+
+    if str(request.args.get('stream', '')).lower() in ('1', 'true', 'yes'):
+        def events(record):
+            while record is not None:
+                yield f"data: {json.dumps(public(record))}\n\n"
+                if record['status'] in ('done', 'failed'):
+                    return
+                record = upload_jobs.wait_for_update(job_id, record['version'])
+        return Response(events(job), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    return jsonify(public(job))
+
 #---------------------------- #
 # negative pdf query          #
 #---------------------------- #
@@ -625,42 +1013,11 @@ def pdf_query_negative():
         query_text = generate_contradictory(selectedText)
         query_embedding = embedder.encode(query_text, normalize_embeddings=True)
 
-        section_data = []
-        for doc in documents:
-            filename = doc.get('filename') or doc.get('serverFilename') or doc.get('name')
-            sections_list = doc.get('sections')
-            if not sections_list:
-                outline_obj = doc.get('outline') or {}
-                sections_list = outline_obj.get('outline') if isinstance(outline_obj, dict) else None
-            if not sections_list:
-                continue
-
-            for item in sections_list:
-                if isinstance(item, dict) and 'text' in item:
-                    heading = item.get('heading') or item.get('text')
-                    full_text = item['text']
-                    page = item.get('page')
-                    rects = item.get('rects', [])
-                    start_line = item.get('start_line')
-                    end_line = item.get('end_line')
-                    start_page = item.get('start_page')
-                    end_page = item.get('end_page')
-                else:
-                    continue
-
-                emb = embedder.encode(full_text, normalize_embeddings=True)
-                section_data.append({
-                    'Document': filename,
-                    'Page': page if page is not None else -1,
-                    'heading': heading,
-                    'text': full_text,
-                    'embedding': emb,
-                    'rects': rects,
-                    'start_line': start_line,
-                    'end_line': end_line,
-                    'start_page': start_page,
-                    'end_page': end_page
-                })
+        search_library = bool(data.get('search_library'))
+        if search_library:
+            section_data = library_section_data(query_embedding, item_parser=parse_text_section_item)
+        else:
+            section_data = gather_section_data(documents, item_parser=parse_text_section_item)
 
         if not section_data:
             return jsonify({"error": "No headings/sections found"}), 400
@@ -671,7 +1028,7 @@ def pdf_query_negative():
         now = datetime.now().isoformat()
         output = {
             "metadata": {
-                "input_documents": [d.get('filename') for d in documents],
+                "input_documents": sorted({sec['Document'] for sec in section_data}) if search_library else [d.get('filename') for d in documents],
                 "selected_text": selectedText,
                 "processing_timestamp": now
             },
@@ -702,7 +1059,6 @@ def pdf_query_negative():
                 "start_page": sec.get('start_page'),
                 "end_page": sec.get('end_page')
             })
-        annotated_map = highlight_refined_texts_negative(output)
         # Build the text for LLM podcast summarization, preserving importance order
         sections_formatted = "\n\n".join(
             f"Section {i+1} (Rank {sec.get('importance_rank', '?')}): {sec.get('section_title', 'Untitled')}\n{sec['refined_text']}"
@@ -711,7 +1067,7 @@ def pdf_query_negative():
         )
         output['sections_formatted'] = sections_formatted
         
-        output['metadata']['annotated_files'] = annotated_map
+        output['metadata']['highlights'] = highlight_overlays_negative(output)
 
         
         print("done pdf negative processing to find contradictions")
@@ -750,7 +1106,10 @@ def generate_summary():
         ---
         """
 
-        summary_text = llm.generate(prompt).strip()
+        if wants_stream(data):
+            return stream_llm(prompt, "summary")
+
+        summary_text = get_llm().generate(prompt).strip()
         return jsonify({"summary": summary_text})
 
     except Exception as e:
@@ -784,7 +1143,10 @@ def generate_didyouknow():
         ---
         """
 
-        didyouknow_text = llm.generate(prompt).strip()
+        if wants_stream(data):
+            return stream_llm(prompt, "didYouKnow")
+
+        didyouknow_text = get_llm().generate(prompt).strip()
         return jsonify({"didYouKnow": didyouknow_text})
     except Exception as e:
         logger.exception("Error in generate_didyouknow")
@@ -796,17 +1158,6 @@ def generate_didyouknow():
 @app.route('/generate_podcast', methods=['POST'])
 def generate_podcast():
     try:
-        # Example voice lists for Azure OpenAI TTS (can be customized)
-        MALE_VOICES = ["alloy", "echo", "onyx"]
-        FEMALE_VOICES = ["fable", "nova", "shimmer"]
-
-        # Example voices for Cognitive Services fallback
-        CS_MALE_VOICES = ["en-IN-ArjunNeural", "en-IN-PrabhatNeural"]
-        CS_FEMALE_VOICES = ["en-IN-AartiNeural", "en-IN-AnanyaNeural"]
-
-        AUDIO_DIR = os.path.join(os.getcwd(), "static/audio")
-        os.makedirs(AUDIO_DIR, exist_ok=True)
-
         data = request.get_json(force=True)
         if not data:
             return jsonify({"error": "Invalid JSON"}), 400
@@ -834,86 +1185,45 @@ def generate_podcast():
         ---
         """
 
-        # ---------------- LLM Generation ----------------
-        podcast_script = llm.generate(prompt).strip()
-        logger.info("Generated Script:\n%s", podcast_script)
-
-        # Split podcast script by speaker
-        tts_segments = []
-        for line in podcast_script.splitlines():
-            if not line.strip():
-                continue
-            if line.startswith("Host:"):
-                tts_segments.append((line.replace("Host:", "").strip(), "male"))
-            elif line.startswith("Guest:"):
-                tts_segments.append((line.replace("Guest:", "").strip(), "female"))
+        streaming = wants_stream(data)
+        backend_names = podcast_backend_names()
+        cache_key = podcast_cache_key("dialogue", prompt, backend_names)
+        cached = claim_podcast(cache_key, streaming)
+        if cached:
+            return jsonify(podcast_response(cached, streaming, cached=True))
+
+        try:
+            # ---------------- LLM Generation ----------------
+            podcast_script = get_llm().generate(prompt).strip()
+            logger.info("Generated Script:\n%s", podcast_script)
+
+            tts_segments = parse_script(podcast_script)
+            if not tts_segments:
+                podcast_cache.release(cache_key)
+                return jsonify({"error": "LLM returned an empty script"}), 502
+
+            filename = podcast_cache.filename(cache_key) if podcast_cache.enabled else podcast_filename()
+            file_path = os.path.join(AUDIO_DIR, filename)
+
+            # ---------------- TTS: lines synthesized concurrently, Azure OpenAI then Cognitive Services ----------------
+            if streaming:
+                tts_backend, voices = start_podcast_stream(tts_segments, file_path, backend_names=backend_names,
+                                                           on_done=janitor.pin, seed=cache_key)
             else:
-                tts_segments.append((line.strip(), "male"))
-
-        # Generate unique filename
-        filename = secure_filename(f"podcast_{int(time.time())}.mp3")
-        file_path = os.path.join(AUDIO_DIR, filename)
-
-        # ---------------- Try Azure OpenAI TTS ----------------
-        use_openai = bool(os.getenv("AZURE_TTS_KEY") and os.getenv("AZURE_TTS_ENDPOINT"))
-        combined_audio = None
-        if use_openai:
-            try:
-                for idx, (text_line, gender) in enumerate(tts_segments):
-                    voice = random.choice(MALE_VOICES) if gender == "male" else random.choice(FEMALE_VOICES)
-                    temp_file = os.path.join(AUDIO_DIR, f".temp_{idx}.mp3")
-                    generate_audio(text_line, temp_file, provider="azure", voice=voice)
-                    segment = AudioSegment.from_file(temp_file, format="mp3")
-                    combined_audio = segment if combined_audio is None else combined_audio + segment
-                    os.remove(temp_file)
-                combined_audio.export(file_path, format="mp3")
-                logger.info("Azure OpenAI TTS successful")
-            except Exception as e:
-                logger.warning(f"Azure OpenAI TTS failed, falling back to Cognitive Services: {e}")
-                use_openai = False
-
-        # ---------------- Fallback to Azure Cognitive Services ----------------
-        if not use_openai:
-            AZURE_SPEECH_KEY = "BMxJMWlLoKNGAHGtxofG9cEEApeDcdRUmurUFxOnBloIxVVkv8qMJQQJ99BHACGhslBXJ3w3AAAYACOG6n5a"
-            AZURE_SPEECH_REGION = "centralindia"
-            if not AZURE_SPEECH_KEY or not AZURE_SPEECH_REGION:
-                raise RuntimeError("No valid Azure TTS credentials available")
-
-            speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-            combined_audio = None
-            for idx, (text_line, gender) in enumerate(tts_segments):
-                voice = random.choice(CS_MALE_VOICES) if gender == "male" else random.choice(CS_FEMALE_VOICES)
-                ssml_text = f"""
-                <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">
-                    <voice name="{voice}">
-                        <prosody rate="0%">{saxutils.escape(text_line)}</prosody>
-                        <break time="500ms"/>
-                    </voice>
-                </speak>
-                """
-                temp_file = os.path.join(AUDIO_DIR, f".temp_cs_{idx}.wav")
-                audio_config = speechsdk.audio.AudioOutputConfig(filename=temp_file)
-                synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-                result = synthesizer.speak_ssml_async(ssml_text).get()
-                if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
-                    raise RuntimeError(f"Cognitive Services TTS failed for line {idx}")
-                segment = AudioSegment.from_file(temp_file, format="wav")
-                combined_audio = segment if combined_audio is None else combined_audio + segment
-                os.remove(temp_file)
-            combined_audio.export(file_path, format="mp3")
-            logger.info("Azure Cognitive Services TTS successful")
-
-        podcast_audio_url = f"http://localhost:5001/static/audio/{filename}"
-
-        return jsonify({
-            "script": podcast_script,
-            "audio_url": podcast_audio_url,
-            "voices_used": {
-                "host": tts_segments[0][1],
-                "guest": tts_segments[1][1] if len(tts_segments) > 1 else "female"
-            }
-        })
-
+                pcm_segments, tts_backend, voices = synthesize_podcast(tts_segments, backend_names, seed=cache_key)
+                encode_mp3(pcm_segments, file_path)
+                janitor.pin(file_path)
+        except Exception:
+            podcast_cache.release(cache_key)
+            raise
+
+        record = {"filename": filename, "script": podcast_script, "tts_backend": tts_backend,
+                  "voices_used": {"host": voices["male"], "guest": voices["female"]}}
+        podcast_cache.put(cache_key, record)
+        return jsonify(podcast_response(record, streaming))
+
+    except PodcastBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         logger.exception("Error in generate_podcast")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
@@ -942,56 +1252,11 @@ def pdf_query():
         query_text = selectedText
         query_embedding = embedder.encode(query_text, normalize_embeddings=True)
 
-        section_data = []
-        for doc in documents:
-            filename = doc.get('filename') or doc.get('serverFilename') or doc.get('name')
-            sections_list = doc.get('sections')
-            if not sections_list:
-                outline_obj = doc.get('outline') or {}
-                sections_list = outline_obj.get('outline') if isinstance(outline_obj, dict) else None
-
-            if not sections_list:
-                continue
-
-            for item in sections_list:
-                if isinstance(item, dict) and 'text' in item and 'heading' in item:
-                    heading = item['heading']
-                    full_text = item['text']
-                    page = item.get('page')
-                    rects = item.get('rects', [])
-                    start_line = item.get('start_line')
-                    end_line = item.get('end_line')
-                    start_page = item.get('start_page')
-                    end_page = item.get('end_page')
-                elif isinstance(item, dict) and 'text' in item and 'level' in item:
-                    heading = item['text']
-                    full_text = item['text']
-                    page = item.get('page')
-                    rects = []
-                    start_line = end_line = start_page = end_page = None
-                else:
-                    heading = item.get('heading') if isinstance(item, dict) else str(item)
-                    full_text = item.get('text') if isinstance(item, dict) else heading
-                    page = item.get('page') if isinstance(item, dict) else None
-                    rects = item.get('rects') if isinstance(item, dict) else []
-                    start_line = item.get('start_line') if isinstance(item, dict) else None
-                    end_line = item.get('end_line') if isinstance(item, dict) else None
-                    start_page = item.get('start_page') if isinstance(item, dict) else None
-                    end_page = item.get('end_page') if isinstance(item, dict) else None
-
-                emb = embedder.encode(full_text, normalize_embeddings=True)
-                section_data.append({
-                    'Document': filename,
-                    'Page': page if page is not None else -1,
-                    'heading': heading,
-                    'text': full_text,
-                    'embedding': emb,
-                    'rects': rects,
-                    'start_line': start_line,
-                    'end_line': end_line,
-                    'start_page': start_page,
-                    'end_page': end_page
-                })
+        search_library = bool(data.get('search_library'))
+        if search_library:
+            section_data = library_section_data(query_embedding)
+        else:
+            section_data = gather_section_data(documents)
 
         if not section_data:
             return jsonify({"error": "No headings/sections found in supplied documents"}), 400
@@ -1009,7 +1274,7 @@ def pdf_query():
             now = datetime.now().isoformat()
             out = {
                 "metadata": {
-                    "input_documents": [d.get('filename') for d in documents],
+                    "input_documents": sorted({sec['Document'] for sec in section_data}) if search_library else [d.get('filename') for d in documents],
                     "selected_text": selectedText,
                     "processing_timestamp": now
                 },
@@ -1041,20 +1306,24 @@ def pdf_query():
                     "end_page": sec.get('end_page')
                 })
 
-            annotated_map = highlight_refined_texts(out)
             sections_formatted = "\n\n".join(
                 f"Section {i+1} (Rank {sec.get('importance_rank', '?')}): {sec.get('section_title', 'Untitled')}\n{sec['refined_text']}"
                 for i, sec in enumerate(sorted(out['subsection_analysis'], key=lambda x: x.get('importance_rank', 999)))
                 if sec.get('refined_text')
             )
             out['sections_formatted'] = sections_formatted
-            out['metadata']['annotated_files'] = annotated_map
             return out
 
         output = {
             "Positive": build_output(pos_indices, "Positive"),
             "Negative": build_output(neg_indices, "Negative")
         }
+
+        # positive (yellow) and contradicting (light red) layers are drawn together on each file
+        highlights = highlight_layer_overlays([(output["Positive"], None), (output["Negative"], NEGATIVE_COLOR)])
+        for out in output.values():
+            docs = {sec['document'] for sec in out['extracted_sections']}
+            out['metadata']['highlights'] = {k: v for k, v in highlights.items() if k in docs}
         print("printing output ", output)
         return jsonify(output)
 
@@ -1096,56 +1365,11 @@ def role_query():
         query_text = f"{job} {persona}"
         query_embedding = embedder.encode(query_text, normalize_embeddings=True)
 
-        section_data = []
-        for doc in documents:
-            filename = doc.get('filename') or doc.get('serverFilename') or doc.get('name')
-            sections_list = doc.get('sections')
-            if not sections_list:
-                outline_obj = doc.get('outline') or {}
-                sections_list = outline_obj.get('outline') if isinstance(outline_obj, dict) else None
-
-            if not sections_list:
-                continue
-
-            for item in sections_list:
-                if isinstance(item, dict) and 'text' in item and 'heading' in item:
-                    heading = item['heading']
-                    full_text = item['text']
-                    page = item.get('page')
-                    rects = item.get('rects', [])
-                    start_line = item.get('start_line')
-                    end_line = item.get('end_line')
-                    start_page = item.get('start_page')
-                    end_page = item.get('end_page')
-                elif isinstance(item, dict) and 'text' in item and 'level' in item:
-                    heading = item['text']
-                    full_text = item['text']
-                    page = item.get('page')
-                    rects = []
-                    start_line = end_line = start_page = end_page = None
-                else:
-                    heading = item.get('heading') if isinstance(item, dict) else str(item)
-                    full_text = item.get('text') if isinstance(item, dict) else heading
-                    page = item.get('page') if isinstance(item, dict) else None
-                    rects = item.get('rects') if isinstance(item, dict) else []
-                    start_line = item.get('start_line') if isinstance(item, dict) else None
-                    end_line = item.get('end_line') if isinstance(item, dict) else None
-                    start_page = item.get('start_page') if isinstance(item, dict) else None
-                    end_page = item.get('end_page') if isinstance(item, dict) else None
-
-                emb = embedder.encode(full_text, normalize_embeddings=True)
-                section_data.append({
-                    'Document': filename,
-                    'Page': page if page is not None else -1,
-                    'heading': heading,
-                    'text': full_text,
-                    'embedding': emb,
-                    'rects': rects,
-                    'start_line': start_line,
-                    'end_line': end_line,
-                    'start_page': start_page,
-                    'end_page': end_page
-                })
+        search_library = bool(data.get('search_library'))
+        if search_library:
+            section_data = library_section_data(query_embedding)
+        else:
+            section_data = gather_section_data(documents)
 
         if not section_data:
             return jsonify({"error": "No headings/sections found in supplied documents"}), 400
@@ -1156,7 +1380,7 @@ def role_query():
         now = datetime.now().isoformat()
         output = {
             "metadata": {
-                "input_documents": [d.get('filename') for d in documents],
+                "input_documents": sorted({sec['Document'] for sec in section_data}) if search_library else [d.get('filename') for d in documents],
                 "persona": persona,
                 "job_to_be_done": job,
                 "processing_timestamp": now
@@ -1189,8 +1413,6 @@ def role_query():
                 "end_page": sec.get('end_page')
             })
 
-        annotated_map = highlight_refined_texts(output)  # returns { original_filename: annotated_filename, ... }
-
         # Build the text for LLM podcast summarization, preserving importance order
         sections_formatted = "\n\n".join(
             f"Section {i+1} (Rank {sec.get('importance_rank', '?')}): {sec.get('section_title', 'Untitled')}\n{sec['refined_text']}"
@@ -1198,8 +1420,8 @@ def role_query():
             if sec.get('refined_text')
         )
 
-        # attach to metadata so frontend can use annotated copies
-        output['metadata']['annotated_files'] = annotated_map
+        # attach to metadata so the viewer can draw the highlights on the original PDF
+        output['metadata']['highlights'] = highlight_overlays(output)
         
         output['sections_formatted'] = sections_formatted
         return jsonify(output)
@@ -1219,10 +1441,17 @@ def serve_pdf(filename):
         return jsonify({"error": f"File '{safe_name}' not found"}), 404
 
     try:
+        janitor.pin(file_path)
         return send_from_directory(app.config['UPLOAD_FOLDER'], safe_name)
     except Exception as e:
         app.logger.error(f"Error serving PDF '{safe_name}': {e}")
         return jsonify({"error": f"Error serving PDF: {str(e)}"}), 500
+@app.after_request
+def pin_served_audio(response):
+    # podcast audio is served by Flask's static route; count each fetch as a use
+    if request.endpoint == 'static' and response.status_code == 200:
+        janitor.pin(os.path.join(app.static_folder, request.view_args.get('filename', '')))
+    return response
 #----------------------------- LLM Route handling --------------------------------------#
 @app.route('/<task>', methods=['POST'])
 def generate(task):
@@ -1241,7 +1470,10 @@ def generate(task):
         elif task != "generate":
             return jsonify({"error": "Invalid task"}), 400
 
-        response = llm.generate(prompt)
+        if wants_stream(data):
+            return stream_llm(prompt, "response")
+
+        response = get_llm().generate(prompt)
         return jsonify({"response": response})
     except Exception as e:
         logger.exception("Error in generate")
@@ -1249,31 +1481,90 @@ def generate(task):
 
 @app.route('/files', methods=['GET'])
 def list_files():
+    """
+    Paginated listing from the file catalog (no directory scan).
+    Query params: offset, limit (max 1000), sort (uploaded_at|filename|size), order (asc|desc),
+    include_derived (also list annotated copies).
+    """
     try:
-        files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            if filename.endswith('.pdf'):
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file_size = os.path.getsize(filepath)
-                files.append({
-                    "filename": filename,
-                    "size": file_size,
-                    "uploaded_at": os.path.getctime(filepath)
-                })
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(1000, max(1, int(request.args.get('limit', 100))))
+        except ValueError:
+            return jsonify({"error": "offset and limit must be integers"}), 400
+        sort = request.args.get('sort', 'uploaded_at')
+        order = request.args.get('order', 'desc').lower()
+        if order not in ('asc', 'desc'):
+            return jsonify({"error": "order must be asc or desc"}), 400
+        include_derived = str(request.args.get('include_derived', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            files, total = file_catalog.list(offset=offset, limit=limit, sort=sort,
+                                             descending=(order == 'desc'), include_derived=include_derived)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         return jsonify({
             "success": True,
             "files": files,
-            "count": len(files)
+            "count": len(files),
+            "total": total,
+            "offset": offset,
+            "limit": limit
         })
     except Exception as e:
         logger.exception("Error listing files")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
-AUDIO_DIR = os.path.join("static", "audio")
-os.makedirs(AUDIO_DIR, exist_ok=True)
-
 #---------------------   PodCast -----------------------------------#
 
+def podcast_filename():
+    return secure_filename(f"podcast_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp3")
+
+def podcast_cache_key(kind, prompt, backend_names):
+    """Podcast identity: the full prompt, the LLM that writes the script and the TTS settings."""
+    llm = get_llm()
+    return content_key(kind, prompt, llm.provider, llm.model_name, backend_names, PODCAST_BITRATE)
+
+def claim_podcast(cache_key, streaming):
+    """
+    The cached (or, for streams, in-progress) podcast to answer with, or None once this request has
+    claimed cache_key and must generate it. Identical requests meanwhile wait up to PODCAST_JOIN_WAIT
+    seconds for it (PodcastBusy after that) instead of encoding the same file again.
+    """
+    while True:
+        record = podcast_cache.get(cache_key, wait=PODCAST_JOIN_WAIT, complete=not streaming)
+        if record or podcast_cache.claim(cache_key):
+            return record
+
+def podcast_response(record, streaming, cached=False, details=True):
+    """Response body for a new or cached podcast; an MP3 still being encoded always gets a stream_url."""
+    filename = record["filename"]
+    body = {
+        "script": record["script"],
+        "audio_url": f"http://localhost:5001/static/audio/{filename}",
+    }
+    if streaming or not record.get("complete", True):
+        body["stream_url"] = f"http://localhost:5001/podcast_stream/{filename}"
+    if details:
+        body["tts_backend"] = record["tts_backend"]
+        body["voices_used"] = record["voices_used"]
+    if cached:
+        janitor.pin(os.path.join(AUDIO_DIR, filename))
+        body["cached"] = True
+    return body
+
+@app.route("/podcast_stream/<filename>", methods=["GET"])
+def podcast_stream(filename):
+    """The podcast MP3, sent as it is encoded; ends when the file is complete."""
+    filename = secure_filename(filename)
+    file_path = os.path.join(AUDIO_DIR, filename)
+    if not (filename.startswith("podcast_") and filename.endswith(".mp3")) or not podcast_exists(file_path):
+        return jsonify({"error": "Unknown podcast"}), 404
+    janitor.pin(file_path)
+    return Response(follow_mp3(file_path), mimetype="audio/mpeg", headers={"Cache-Control": "no-cache"})
+
+
 @app.route("/podcast", methods=["POST"])
 def podcast():
     try:
@@ -1290,33 +1581,52 @@ def podcast():
         podcast_prompt = podcast_input + """
         Please create a concise and engaging 2-minute summary...
         """
-        script_text = llm.generate(podcast_prompt)
-
-        # 2. Convert to Audio
-        filename = secure_filename(f"podcast_{int(time.time())}.mp3")
-        file_path = os.path.join(AUDIO_DIR, filename)
-
+        streaming = wants_stream(data)
         tts_provider = os.getenv("TTS_PROVIDER", "gcp").lower()
-
-        if tts_provider == "azure":
-            # Use Adobe’s provided script (Azure TTS)
-            generate_audio(script_text, file_path)  
-        else:
-            # Local dev: fallback to Google TTS
-            tts = gTTS(text=script_text, lang="en", slow=False)
-            tts.save(file_path)
+        backends = podcast_backend_names() if tts_provider == "azure" or os.getenv("TTS_BACKEND") else ["gtts"]
+        cache_key = podcast_cache_key("narration", podcast_prompt, backends)
+        cached = claim_podcast(cache_key, streaming)
+        if cached:
+            return jsonify(podcast_response(cached, streaming, cached=True, details=False))
+
+        try:
+            script_text = get_llm().generate(podcast_prompt)
+
+            # 2. Convert to Audio
+            filename = podcast_cache.filename(cache_key) if podcast_cache.enabled else podcast_filename()
+            file_path = os.path.join(AUDIO_DIR, filename)
+            record = {"filename": filename, "script": script_text}
+
+            if streaming:
+                start_podcast_stream(split_narration(script_text), file_path, backend_names=backends,
+                                     on_done=janitor.pin, seed=cache_key)
+            else:
+                # written under a private name and renamed, so joiners never see a half-written MP3
+                part = part_path(file_path)
+                if tts_provider == "azure":
+                    # Use Adobe’s provided script (Azure TTS)
+                    lazy_import("generate_audio", "generate_audio")(script_text, part)
+                else:
+                    # Local dev: fallback to Google TTS
+                    tts = lazy_import("gtts", "gTTS")(text=script_text, lang="en", slow=False)
+                    tts.save(part)
+                os.replace(part, file_path)
+                janitor.pin(file_path)
+        except Exception:
+            podcast_cache.release(cache_key)
+            raise
+        podcast_cache.put(cache_key, record)
 
         # 3. Return script + audio URL
-        return jsonify({
-            "script": script_text,
-            "audio_url": f"http://localhost:5001/static/audio/{filename}"
-        })
+        return jsonify(podcast_response(record, streaming, details=False))
 
+    except PodcastBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
 if __name__ == '__main__':
-    load_model()
+    init_worker()
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,137 @@
+# fileCatalog.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = "_catalog.sqlite3"
+DERIVED_PREFIXES = ("annotated_", "annotatedNeg_")
+SORT_COLUMNS = ("uploaded_at", "filename", "size")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename       TEXT PRIMARY KEY,
+    original_name  TEXT,
+    digest         TEXT,
+    size           INTEGER NOT NULL,
+    uploaded_at    REAL NOT NULL,
+    derived        INTEGER NOT NULL DEFAULT 0,
+    outline_count  INTEGER,
+    section_count  INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_derived_uploaded ON files (derived, uploaded_at);
+CREATE INDEX IF NOT EXISTS files_derived_filename ON files (derived, filename);
+CREATE INDEX IF NOT EXISTS files_derived_size ON files (derived, size);
+"""
+
+_inherited = []  # connections a forked child inherited; kept referenced so they are never closed there
+
+
+def is_derived(filename):
+    return filename.startswith(DERIVED_PREFIXES)
+
+
+class FileCatalog:
+    """
+    SQLite catalog of the PDFs in uploads/, so /files never lists or stats the directory.
+    /upload records originals with their outline/section counts; annotated copies (written by
+    earlier versions) are listed as derived and dropped when the janitor evicts them.
+    One connection per thread; WAL lets server processes read while another one writes.
+    Connections are only opened on first use, so a preloading gunicorn master that never touches
+    the catalog hands its workers no SQLite handle.
+    """
+
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        self.path = os.path.join(upload_folder, CATALOG_FILENAME)
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            if conn is not None:
+                # opened before a fork: SQLite must not be used, or closed, from the child
+                _inherited.append(conn)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, filename, size, uploaded_at=None, digest=None, original_name=None,
+               outline_count=None, section_count=None):
+        """Insert or refresh one file's entry."""
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO files (filename, original_name, digest, size, uploaded_at, derived, outline_count, section_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET "
+                "  size = excluded.size, uploaded_at = excluded.uploaded_at, "
+                "  original_name = COALESCE(excluded.original_name, files.original_name), "
+                "  digest = COALESCE(excluded.digest, files.digest), "
+                "  outline_count = COALESCE(excluded.outline_count, files.outline_count), "
+                "  section_count = COALESCE(excluded.section_count, files.section_count)",
+                (filename, original_name, digest, int(size),
+                 time.time() if uploaded_at is None else uploaded_at,
+                 int(is_derived(filename)), outline_count, section_count))
+
+    def remove(self, filename):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+
+    def list(self, offset=0, limit=100, sort="uploaded_at", descending=True, include_derived=False):
+        """Return (rows, total) for one page of the listing."""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+        where = "" if include_derived else "WHERE derived = 0"
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM files {where}").fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM files {where} ORDER BY {sort} {'DESC' if descending else 'ASC'}, filename "
+            f"LIMIT ? OFFSET ?", (int(limit), int(offset))).fetchall()
+        return [dict(row, derived=bool(row["derived"])) for row in rows], total
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def backfill(self, records_dir=None):
+        """
+        One-time import of an existing uploads/ folder (e.g. after upgrading).
+        Counts come from the /upload records in records_dir when present.
+        """
+        counts = {}
+        if records_dir and os.path.isdir(records_dir):
+            for name in os.listdir(records_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(records_dir, name), "r", encoding="utf-8") as f:
+                        payload = json.load(f)
+                    counts[payload["filename"]] = (name[:-len(".json")],
+                                                   len(payload.get("outline", {}).get("outline", [])),
+                                                   len(payload.get("sections", [])))
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable upload record {name}: {e}")
+
+        added = 0
+        with os.scandir(self.upload_folder) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.endswith(".pdf"):
+                    continue
+                st = entry.stat()
+                digest, outline_count, section_count = counts.get(entry.name, (None, None, None))
+                self.record(entry.name, st.st_size, uploaded_at=st.st_ctime, digest=digest,
+                            original_name=entry.name.split("_", 1)[-1] if digest else None,
+                            outline_count=outline_count, section_count=section_count)
+                added += 1
+        if added:
+            logger.info(f"Backfilled {added} files into the catalog")
+        return added
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+bind = f"0.0.0.0:{os.getenv('BACKEND_PORT', '5001')}"
+
+# pre-forked workers, each serving WEB_THREADS requests at once, so a slow podcast or LLM call
+# only occupies one thread instead of the whole server
+workers = int(os.getenv("WEB_WORKERS", str(max(2, (os.cpu_count() or 2) // 2))))
+os.environ["WEB_WORKERS"] = str(workers)  # the app sizes each worker's parse pool by it
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+backlog = int(os.getenv("WEB_BACKLOG", "128"))               # pending connections queued by the kernel
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))               # podcast generation can take minutes
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))      # recycle workers after N requests (0: never)
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+
+# import the app (and, with PRELOAD_MODELS, the model weights) once in the master
+preload_app = os.getenv("PRELOAD_MODELS", "1").lower() in ("1", "true", "yes")
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    torch_threads = os.getenv("TORCH_NUM_THREADS")
+    if torch_threads:
+        # keep workers x torch threads within the cores
+        try:
+            import torch
+            torch.set_num_threads(int(torch_threads))
+        except ImportError:
+            pass
+    from app import init_worker
+    init_worker()
@@ -0,0 +1,168 @@
+# janitor.py
+import os
+import time
+import fcntl
+import fnmatch
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "300"))        # seconds between sweeps
+JANITOR_PIN_SECONDS = int(os.getenv("JANITOR_PIN_SECONDS", "3600"))  # files referenced this recently are never evicted
+
+
+class RetentionRule:
+    """
+    Files in `directory` matching any of `patterns`.
+    - max_age: evict files not used for this many seconds (None: no age limit)
+    - max_bytes: evict least recently used files until the matched total fits (None: no size limit)
+    """
+
+    def __init__(self, directory, patterns, max_age=None, max_bytes=None):
+        self.directory = directory
+        self.patterns = tuple(patterns)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    def matches(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+
+class Janitor:
+    """
+    Background thread that applies RetentionRules every `interval` seconds.
+    A file's last use is the later of its mtime and the last time it was pinned; pin() is called
+    whenever a response links or serves a file, so anything handed out recently survives.
+    pin() also bumps the file's mtime, so pins made in other server processes count too.
+    on_remove(path), if given, is called for every evicted file.
+    With lock_path, every server worker may start() its janitor but only the one holding an exclusive
+    flock on lock_path sweeps; when that worker exits, another one takes over at its next interval.
+    """
+
+    def __init__(self, rules, interval=JANITOR_INTERVAL, pin_seconds=JANITOR_PIN_SECONDS, on_remove=None,
+                 lock_path=None):
+        self.rules = list(rules)
+        self.on_remove = on_remove
+        self.lock_path = lock_path
+        self._lock_file = None
+        self.interval = interval
+        self.pin_seconds = pin_seconds
+        self._refs = {}  # abs path -> last reference time
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # a forked server worker must not inherit a lock held by the sweeping thread
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        if self._lock_file is not None:
+            self._lock_file.close()  # the parent keeps the lock (a shared flock outlives this copy)
+            self._lock_file = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def pin(self, *paths):
+        now = time.time()
+        with self._lock:
+            for path in paths:
+                if path:
+                    self._refs[os.path.abspath(path)] = now
+        for path in paths:
+            if path:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _is_leader(self):
+        if self.lock_path is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # held until this process exits
+        logger.info(f"Janitor sweeping in process {os.getpid()}")
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self._is_leader():
+                    self.sweep()
+            except Exception:
+                logger.exception("Janitor sweep failed")
+            self._stop.wait(self.interval)
+
+    def _last_used(self, path, mtime):
+        with self._lock:
+            return max(mtime, self._refs.get(path, 0.0))
+
+    def sweep(self):
+        """Run every rule once; returns (files_removed, bytes_freed)."""
+        now = time.time()
+        removed = freed = 0
+        for rule in self.rules:
+            if not os.path.isdir(rule.directory):
+                continue
+            entries = []  # (last_used, size, path)
+            with os.scandir(rule.directory) as it:
+                for entry in it:
+                    if not entry.is_file(follow_symlinks=False) or not rule.matches(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    path = os.path.abspath(entry.path)
+                    entries.append((self._last_used(path, st.st_mtime), st.st_size, path))
+
+            entries.sort()  # least recently used first
+            total = sum(size for _, size, _ in entries)
+            for last_used, size, path in entries:
+                if now - last_used < self.pin_seconds:
+                    break  # everything after this is newer still
+                expired = rule.max_age is not None and now - last_used > rule.max_age
+                over_size = rule.max_bytes is not None and total > rule.max_bytes
+                if not expired and not over_size:
+                    break  # newer files are neither expired nor needed to get under the size cap
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Janitor could not remove {path}: {e}")
+                    continue
+                total -= size
+                removed += 1
+                freed += size
+                with self._lock:
+                    self._refs.pop(path, None)
+                if self.on_remove is not None:
+                    try:
+                        self.on_remove(path)
+                    except Exception:
+                        logger.exception(f"Janitor on_remove failed for {path}")
+
+        # forget references to files that are gone
+        with self._lock:
+            for path in [p for p in self._refs if not os.path.exists(p)]:
+                del self._refs[path]
+
+        if removed:
+            logger.info(f"Janitor removed {removed} files ({freed // (1024 * 1024)}MB)")
+        return removed, freed
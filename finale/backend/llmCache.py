@@ -0,0 +1,111 @@
+# llmCache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))          # in-memory entries
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))   # seconds; 0 disables the cache
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")           # empty: memory tier only
+
+
+def cache_key(provider, model, prompt):
+    """Content address of one generation: provider, model and the exact prompt."""
+    raw = json.dumps([provider, model, prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+    - memory: LRU of up to max_entries responses
+    - disk: one <key>.json per response in `directory`, shared by every server process
+    Entries older than ttl seconds are misses on both tiers. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, directory=LLM_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory or None
+        self._memory = OrderedDict()  # key -> (created_at, response)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                if now - record["created_at"] <= self.ttl:
+                    self._remember(key, record["created_at"], record["response"])
+                    self._count("disk_hits")
+                    return record["response"]
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Unreadable LLM cache entry {path}: {e}")
+
+        self._count("misses")
+        return None
+
+    def _remember(self, key, created_at, response):
+        with self._lock:
+            self._memory[key] = (created_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def put(self, key, response):
+        if not self.enabled:
+            return
+        created_at = time.time()
+        self._remember(key, created_at, response)
+        self._count("stores")
+        if self.directory:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"created_at": created_at, "response": response}, f)
+                os.replace(tmp, path)
+            except Exception as e:
+                logger.warning(f"Could not write LLM cache entry {path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {**self._stats, "entries": len(self._memory),
+                    "hit_rate": round(hits / lookups, 4) if lookups else None}
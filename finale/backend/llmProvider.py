@@ -1,16 +1,47 @@
 import os
+import sys
 import json
+import time
+import random
+import logging
+import threading
 import requests
-from typing import Callable, Dict
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator
+from llmCache import ResponseCache, cache_key
 
-# from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
-try:
-    from google.generativeai import GenerativeModel, configure
-except ImportError:
-    GenerativeModel = None
-    configure = None
+# google-generativeai (grpc/protobuf) is only imported when the gemini provider is initialised
+
+logger = logging.getLogger(__name__)
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))      # per read; a stream may run longer in total
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))            # retries after the first attempt
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))      # seconds, doubled per retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))    # in-flight provider calls per process
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))     # max wait for a free slot
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMBusyError(RuntimeError):
+    """Every concurrency slot stayed taken for LLM_QUEUE_TIMEOUT seconds."""
+
+
+def _is_retryable(exc):
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS
+    google_exceptions = sys.modules.get("google.api_core.exceptions")  # loaded with the gemini SDK
+    if google_exceptions is not None:
+        return isinstance(exc, (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable,
+                                google_exceptions.InternalServerError, google_exceptions.DeadlineExceeded))
+    return False
 
 
 class LLMClient:
@@ -20,6 +51,17 @@ class LLMClient:
             raise ValueError("LLM_PROVIDER environment variable is not set.")
 
         self.provider = self.provider.lower()
+        self.model_name = None
+        self.cache = ResponseCache()
+        self.timeout = (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+        self._slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+
+        # one pooled keep-alive session for the HTTP providers; sized to the concurrency cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, LLM_MAX_CONCURRENCY))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
 
         if self.provider == "gemini":
             self._init_gemini()
@@ -33,7 +75,9 @@ class LLMClient:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
     def _init_gemini(self):
-        if not configure or not GenerativeModel:
+        try:
+            from google.generativeai import GenerativeModel, configure
+        except ImportError:
             raise ImportError("google-generativeai is not installed. Install with `pip install google-generativeai`.")
 
         creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
@@ -50,55 +94,260 @@ class LLMClient:
             raise ValueError("Google credentials file missing 'api_key'.")
 
         configure(api_key=api_key)
-        self.gemini_model = GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
-
-    # def _init_azure(self):
-    #     self.azure_client = OpenAI(
-    #         api_key=os.getenv("AZURE_OPENAI_KEY"),
-    #         base_url=f"{os.getenv('AZURE_OPENAI_BASE')}/openai/deployments/{os.getenv('AZURE_DEPLOYMENT_NAME')}",
-    #         default_query={"api-version": os.getenv("AZURE_API_VERSION")},
-    #         default_headers={"api-key": os.getenv("AZURE_OPENAI_KEY")},
-    #     )
-    #     self.azure_model = os.getenv("AZURE_DEPLOYMENT_NAME")
-
-    # def _init_openai(self):
-    #     self.openai_client = OpenAI(
-    #         api_key=os.getenv("OPENAI_API_KEY"),
-    #         base_url=os.getenv("OPENAI_API_BASE") or None
-    #     )
-    #     self.openai_model = os.getenv("OPENAI_MODEL", "gpt-4o")
-
-    # def _init_ollama(self):
-    #     self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    #     self.ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
-
-    def generate(self, prompt: str) -> str:
+        self.model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        self.gemini_model = GenerativeModel(self.model_name)
+
+    def _init_azure(self):
+        base_url = os.getenv("AZURE_OPENAI_BASE")
+        deployment = os.getenv("AZURE_DEPLOYMENT_NAME")
+        api_key = os.getenv("AZURE_OPENAI_KEY")
+        if not base_url or not deployment or not api_key:
+            raise ValueError("AZURE_OPENAI_BASE, AZURE_DEPLOYMENT_NAME and AZURE_OPENAI_KEY must be set.")
+        api_version = os.getenv("AZURE_API_VERSION", "2024-06-01")
+        self.model_name = deployment
+        self.chat_url = f"{base_url.rstrip('/')}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
+        self.session.headers.update({"api-key": api_key})
+
+    def _init_openai(self):
+        # any OpenAI-compatible server (OpenAI, vLLM, llama.cpp, LM Studio, ...) via OPENAI_API_BASE
+        base_url = os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1"
+        self.model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
+        self.chat_url = f"{base_url.rstrip('/')}/chat/completions"
+        api_key = os.getenv("OPENAI_API_KEY")
+        if api_key:
+            self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def _init_ollama(self):
+        self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+        self.ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
+        self.ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keep the model loaded between calls
+        self.model_name = self.ollama_model
+
+    def generate(self, prompt: str, use_cache: bool = True) -> str:
+        """Generate a completion; identical prompts to the same provider/model are served from the response cache."""
+        if not use_cache or not self.cache.enabled:
+            return self._generate(prompt)
+        key = cache_key(self.provider, self.model_name, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = self._generate(prompt)
+        if response:
+            self.cache.put(key, response)
+        return response
+
+    def generate_stream(self, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        Yield the completion in chunks as the provider produces them.
+        Cache hits come back as a single chunk; a fully streamed answer is stored in the cache.
+        Providers without a streaming API yield their whole answer as one chunk.
+        """
+        key = cache_key(self.provider, self.model_name, prompt)
+        if use_cache and self.cache.enabled:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        for chunk in self._generate_stream(prompt):
+            if chunk:
+                parts.append(chunk)
+                yield chunk
+
+        response = "".join(parts).strip()
+        if use_cache and response:
+            self.cache.put(key, response)
+
+    def generate_batch(self, prompts, use_cache: bool = True, max_workers: int = None):
+        """
+        Generate completions for many prompts; returns the answers in prompt order.
+        Cached prompts are answered directly, repeated prompts are generated once, and the rest run
+        concurrently over the pooled connections (still bounded by LLM_MAX_CONCURRENCY), which lets
+        servers with continuous batching (vLLM, llama.cpp, Ollama with OLLAMA_NUM_PARALLEL) batch them.
+        """
+        prompts = list(prompts)
+        results = [None] * len(prompts)
+        pending = {}  # prompt -> positions
+        for i, prompt in enumerate(prompts):
+            cached = self.cache.get(cache_key(self.provider, self.model_name, prompt)) \
+                if use_cache and self.cache.enabled else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(prompt, []).append(i)
+
+        if pending:
+            workers = max(1, min(len(pending), max_workers or LLM_MAX_CONCURRENCY))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-batch") as pool:
+                answers = pool.map(self._generate, list(pending))
+                for (prompt, positions), answer in zip(pending.items(), answers):
+                    if use_cache and answer:
+                        self.cache.put(cache_key(self.provider, self.model_name, prompt), answer)
+                    for i in positions:
+                        results[i] = answer
+        return results
+
+    #---- provider calls: concurrency cap + retry #
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise LLMBusyError(f"No free LLM slot within {LLM_QUEUE_TIMEOUT:g}s ({LLM_MAX_CONCURRENCY} calls in flight)")
+
+    def _backoff(self, attempt, exc):
+        delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        logger.warning(f"{self.provider} call failed ({exc}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+        time.sleep(delay)
+
+    def _generate(self, prompt: str) -> str:
+        self._acquire_slot()
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    return self._generate_once(prompt)
+                except Exception as e:
+                    if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                        raise
+                    self._backoff(attempt, e)
+        finally:
+            self._slots.release()
+
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        """Holds a slot for the whole stream; retries only until the first chunk has been yielded."""
+        self._acquire_slot()
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                started = False
+                try:
+                    for chunk in self._stream_once(prompt):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started or attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                        raise
+                    self._backoff(attempt, e)
+        finally:
+            self._slots.release()
+
+    def _stream_once(self, prompt: str) -> Iterator[str]:
         if self.provider == "gemini":
-            response = self.gemini_model.generate_content(prompt)
-            return response.text.strip()
+            for chunk in self.gemini_model.generate_content(prompt, stream=True,
+                                                            request_options={"timeout": LLM_READ_TIMEOUT}):
+                try:
+                    yield chunk.text
+                except ValueError:
+                    # chunk without text parts (e.g. only safety ratings)
+                    continue
 
-        elif self.provider == "azure":
-            res = self.azure_client.chat.completions.create(
-                model=self.azure_model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return res.choices[0].message.content.strip()
+        elif self.provider in ("openai", "azure"):
+            with self.session.post(self.chat_url, json=self._chat_payload(prompt, stream=True),
+                                   stream=True, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                # server-sent events: "data: {chunk json}" lines, closed by "data: [DONE]"
+                for line in resp.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    choices = json.loads(payload).get("choices") or []
+                    if choices:
+                        yield (choices[0].get("delta") or {}).get("content") or ""
 
-        elif self.provider == "openai":
-            res = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return res.choices[0].message.content.strip()
+        elif self.provider == "ollama":
+            with self.session.post(
+                f"{self.ollama_base_url}/api/generate",
+                json={"model": self.ollama_model, "prompt": prompt, "stream": True,
+                      "keep_alive": self.ollama_keep_alive},
+                stream=True,
+                timeout=self.timeout
+            ) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    yield data.get("response", "")
+                    if data.get("done"):
+                        break
+
+        else:
+            yield self._generate_once(prompt)
+
+    def _generate_once(self, prompt: str) -> str:
+        if self.provider == "gemini":
+            response = self.gemini_model.generate_content(prompt, request_options={"timeout": LLM_READ_TIMEOUT})
+            return response.text.strip()
+
+        elif self.provider in ("openai", "azure"):
+            resp = self.session.post(self.chat_url, json=self._chat_payload(prompt, stream=False), timeout=self.timeout)
+            resp.raise_for_status()
+            return (resp.json()["choices"][0]["message"].get("content") or "").strip()
 
         elif self.provider == "ollama":
-            resp = requests.post(
+            resp = self.session.post(
                 f"{self.ollama_base_url}/api/generate",
-                json={"model": self.ollama_model, "prompt": prompt},
-                stream=False
+                json={"model": self.ollama_model, "prompt": prompt, "stream": False,
+                      "keep_alive": self.ollama_keep_alive},
+                timeout=self.timeout
             )
+            resp.raise_for_status()
             data = resp.json()
             return data.get("response", "").strip()
 
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
+
+    def _chat_payload(self, prompt: str, stream: bool) -> Dict:
+        payload = {"messages": [{"role": "user", "content": prompt}], "stream": stream}
+        if self.provider == "openai":
+            payload["model"] = self.model_name  # azure routes by deployment in the URL
+        return payload
+
+
+#---- shared client, created on first use #
+
+_client = None
+_client_error = None
+_client_lock = threading.Lock()
+
+
+def get_llm() -> LLMClient:
+    """
+    Process-wide LLMClient, constructed on first use rather than at import, so processes that
+    never call the LLM start without provider credentials. A failed construction is retried on
+    the next call (e.g. after the credentials file appears) and its error kept for llm_status().
+    """
+    global _client, _client_error
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = LLMClient()
+                _client_error = None
+            except Exception as e:
+                _client_error = f"{type(e).__name__}: {e}"
+                raise
+    return _client
+
+
+def llm_status(initialize: bool = False) -> Dict:
+    """Readiness of the shared client for /health; initialize=True builds it if needed."""
+    if initialize and _client is None:
+        try:
+            get_llm()
+        except Exception:
+            pass
+    client = _client
+    status = {
+        "provider": (os.getenv("LLM_PROVIDER") or "").lower() or None,
+        "initialized": client is not None,
+        "ready": client is not None,
+        "error": _client_error if client is None else None,
+    }
+    if client is not None:
+        status["model"] = client.model_name
+        status["cache"] = client.cache.stats()
+    return status
@@ -0,0 +1,55 @@
+# mmrEngine.py
+import numpy as np
+
+
+def stack_embeddings(sections):
+    """Stack section['embedding'] vectors into one (n, d) float32 matrix."""
+    return np.vstack([np.asarray(s['embedding'], dtype=np.float32).reshape(1, -1) for s in sections])
+
+
+def _l2_normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def query_similarities(query_emb, matrix):
+    """Cosine similarity of the query against every row of matrix, as one matrix-vector product."""
+    q = _l2_normalize(np.asarray(query_emb, dtype=np.float32).reshape(-1))
+    return _l2_normalize(matrix) @ q
+
+
+def mmr_select(query_emb, matrix, lambda_param=0.72, top_k=5):
+    """
+    Maximal Marginal Relevance over an (n, d) embedding matrix.
+    - sim_q is computed once for all rows
+    - each candidate's max similarity to the selected set is updated incrementally with the
+      similarity row of the newly selected item only, so at most top_k rows of the n x n
+      similarity matrix are ever computed
+    Ties resolve to the lowest index, matching the original list-based implementation.
+    Returns (selected_indices, sim_q) with sim_q as a 1-D numpy array.
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return [], np.zeros(0, dtype=np.float32)
+
+    normed = _l2_normalize(np.asarray(matrix, dtype=np.float32))
+    q = _l2_normalize(np.asarray(query_emb, dtype=np.float32).reshape(-1))
+    sim_q = normed @ q
+
+    selected = []
+    available = np.ones(n, dtype=bool)
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+
+    while len(selected) < top_k and available.any():
+        if not selected:
+            scores = sim_q.astype(np.float64)
+        else:
+            scores = lambda_param * sim_q.astype(np.float64) - (1 - lambda_param) * max_sim.astype(np.float64)
+        scores[~available] = -np.inf
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(max_sim, normed @ normed[idx], out=max_sim)
+
+    return selected, sim_q
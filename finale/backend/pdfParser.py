@@ -0,0 +1,313 @@
+# pdfParser.py
+# PDF line/group extraction used by /upload. Kept free of Flask/model imports so that
+# process-pool workers can import it cheaply.
+import os
+import re
+import logging
+import fitz  # PyMuPDF
+import pandas as pd
+from workerPool import get_process_pool, PARSE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+PARSE_SHARD_PAGES = int(os.getenv("PARSE_SHARD_PAGES", "16"))  # below this page count we parse inline
+
+# -------------------------
+# PDF text utilities
+# -------------------------
+def is_bullet_point(text):
+    text = text.strip()
+    bullet_patterns = [
+        r'^[•·▪▫▬►‣⁃]\s*', r'^\*\s+', r'^-\s+', r'^—\s+', r'^–\s+',
+        r'^\+\s+', r'^>\s+', r'^»\s+', r'^○\s+', r'^□\s+', r'^▪\s+', r'^▫\s+'
+    ]
+    for pattern in bullet_patterns:
+        if re.match(pattern, text):
+            return True
+    if re.match(r'^\d+[\.\)]\s*$', text) or re.match(r'^[a-zA-Z][\.\)]\s*$', text):
+        return True
+    if len(text) <= 3 and re.match(r'^[^\w\s]+$', text):
+        return True
+    return False
+
+def should_ignore_text(text):
+    text = text.strip()
+    if len(text) < 2:
+        return True
+    if is_bullet_point(text):
+        return True
+    if re.match(r'^\d+$', text) or re.match(r'^[a-zA-Z]$', text):
+        return True
+    artifacts = ['©', '®', '™', '...', '…']
+    if text in artifacts:
+        return True
+    return False
+
+def clean_text(text):
+    text = text.strip()
+    bullet_patterns = [
+        r'^[•·▪▫▬►‣⁃]\s*', r'^\*\s+', r'^-\s+', r'^—\s+', r'^–\s+',
+        r'^\+\s+', r'^>\s+', r'^»\s+', r'^○\s+', r'^□\s+', r'^▪\s+', r'^▫\s+'
+    ]
+    for pattern in bullet_patterns:
+        text = re.sub(pattern, '', text)
+    return text.strip()
+
+
+def extract_features(text, pdf_path, page_num, font_size, is_bold, is_italic, position_y, y_gap, start_line=None, end_line=None):
+    text_length = len(text)
+    upper_count = sum(1 for c in text if c.isupper())
+    total_alpha = sum(1 for c in text if c.isalpha())
+    capitalization_ratio = upper_count / total_alpha if total_alpha > 0 else 0
+    starts_with_numbering = bool(re.match(r'^\d+(\.\d+)*(\.|\))\s', text))
+    dot_match = re.match(r'^(\d+\.)+(\d+)', text)
+    num_dots_in_prefix = dot_match.group(1).count('.') if dot_match else 0
+
+    row = {
+        'PDF Path': str(pdf_path),
+        'Page Number': page_num,
+        'Section Text': text,
+        'Font Size': font_size,
+        'Is Bold': is_bold,
+        'Is Italic': is_italic,
+        'Text Length': text_length,
+        'Capitalization Ratio': capitalization_ratio,
+        'Starts with Numbering': starts_with_numbering,
+        'Position Y': position_y,
+        'Prefix Dot Count': num_dots_in_prefix,
+        'Y Gap': y_gap
+    }
+    # attach start/end line indexes for later mapping to rects
+    if start_line is not None:
+        row['Start Line'] = int(start_line)
+    if end_line is not None:
+        row['End Line'] = int(end_line)
+    return row
+
+
+# -------------------------
+# analyze_pdf_sections (produces both df for classifier AND lines_list mapping)
+# -------------------------
+def _parse_page(page, page_idx, pdf_path, line_counter, grouped_rows, lines_list):
+    """
+    Parse one page into physical lines (lines_list) and style groups (grouped_rows).
+    All grouping state is per page, so pages can be parsed independently; only the
+    running line_counter ties them together. Returns the updated line_counter.
+    """
+    blocks = page.get_text("dict").get('blocks', [])
+
+    # For grouping we track a current group (list of text lines' indices and texts)
+    current_group_line_indices = []
+    current_group_texts = []
+    # representative style properties for current group (first line's style)
+    current_font_size = None
+    current_bold = None
+    current_italic = None
+    prev_line_y = None
+    prev_y_gap = None
+
+    for block in blocks:
+        if block.get('type') != 0:
+            continue
+        for line in block.get('lines', []):
+            spans = [s for s in line.get('spans', []) if s.get('text','').strip()]
+            if not spans:
+                continue
+
+            line_text = " ".join(span['text'].strip() for span in spans)
+            if should_ignore_text(line_text):
+                continue
+            cleaned = clean_text(line_text)
+            if not cleaned:
+                continue
+
+            # compute bbox for the physical line (union of spans)
+            x0 = min(s['bbox'][0] for s in spans)
+            y0 = min(s['bbox'][1] for s in spans)
+            x1 = max(s['bbox'][2] for s in spans)
+            y1 = max(s['bbox'][3] for s in spans)
+            bbox = [x0, y0, x1, y1]
+
+            # style info from first span of the line
+            first_span = spans[0]
+            font_size = first_span.get('size', 0)
+            font_flags = first_span.get('flags', 0)
+            is_bold = (font_flags & 16) > 0
+            is_italic = (font_flags & 2) > 0
+            y_pos = first_span['bbox'][1]
+
+            # always append a physical line entry
+            lines_list.append({
+                'line_index': line_counter,
+                'page': page_idx + 1,
+                'text': cleaned,
+                'bbox': bbox,
+            })
+            this_line_index = line_counter
+            line_counter += 1
+
+            # compute y gap relative to previous line (for features)
+            if prev_line_y is None:
+                y_gap = None
+            else:
+                y_gap = abs(y_pos - prev_line_y)
+            prev_line_y = y_pos
+
+            # decide whether to continue the current group or start a new group
+            if current_font_size is None:
+                # first line in group
+                current_group_line_indices = [this_line_index]
+                current_group_texts = [cleaned]
+                current_font_size = font_size
+                current_bold = is_bold
+                current_italic = is_italic
+                prev_y_gap = y_gap
+            else:
+                same_style = (abs(current_font_size - font_size) < 0.5 and is_bold == current_bold and is_italic == current_italic)
+                if same_style:
+                    # continue group
+                    current_group_line_indices.append(this_line_index)
+                    current_group_texts.append(cleaned)
+                else:
+                    # finalize previous group into one grouped row
+                    full_text = " ".join(current_group_texts)
+                    if not should_ignore_text(full_text) and len(full_text.strip()) > 2:
+                        start_line = current_group_line_indices[0]
+                        end_line = current_group_line_indices[-1]
+                        feat = extract_features(full_text, pdf_path, page_idx + 1,
+                                                current_font_size, current_bold, current_italic,
+                                                prev_line_y, prev_y_gap, start_line=start_line, end_line=end_line)
+                        grouped_rows.append(feat)
+                    # start new group with this line
+                    current_group_line_indices = [this_line_index]
+                    current_group_texts = [cleaned]
+                    current_font_size = font_size
+                    current_bold = is_bold
+                    current_italic = is_italic
+                    prev_y_gap = y_gap
+
+    # finalize group's leftover at end of page
+    if current_group_texts:
+        full_text = " ".join(current_group_texts)
+        if not should_ignore_text(full_text) and len(full_text.strip()) > 2:
+            start_line = current_group_line_indices[0]
+            end_line = current_group_line_indices[-1]
+            feat = extract_features(full_text, pdf_path, page_idx + 1,
+                                    current_font_size, current_bold, current_italic,
+                                    prev_line_y, prev_y_gap, start_line=start_line, end_line=end_line)
+            grouped_rows.append(feat)
+
+    return line_counter
+
+def parse_page_range(pdf_path, start_page, end_page, on_page=None):
+    """
+    Worker entry point: open our own fitz document and parse pages [start_page, end_page).
+    Line indices are local to the shard (starting at 0) and are rebased when shards are merged.
+    Returns (grouped_rows, lines_list, ok); ok is False if parsing stopped on an error.
+    on_page() is called after every page (only when run in-process).
+    """
+    grouped_rows, lines_list = [], []
+    try:
+        doc = fitz.open(pdf_path)
+        line_counter = 0
+        for page_idx in range(start_page, end_page):
+            line_counter = _parse_page(doc.load_page(page_idx), page_idx, pdf_path,
+                                       line_counter, grouped_rows, lines_list)
+            if on_page is not None:
+                on_page()
+        doc.close()
+    except Exception as e:
+        logger.exception(f"Error processing {pdf_path} pages {start_page}-{end_page}: {e}")
+        return grouped_rows, lines_list, False
+    return grouped_rows, lines_list, True
+
+def _page_shards(page_count):
+    shard_size = max(PARSE_SHARD_PAGES, -(-page_count // max(1, PARSE_WORKERS)))
+    return [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+def _merge_shards(shard_results, grouped_rows, lines_list):
+    """Append shard results in page order, rebasing shard-local line indices to global ones."""
+    for shard_rows, shard_lines, ok in shard_results:
+        offset = len(lines_list)
+        for rec in shard_lines:
+            rec['line_index'] += offset
+            lines_list.append(rec)
+        for row in shard_rows:
+            row['Start Line'] += offset
+            row['End Line'] += offset
+            grouped_rows.append(row)
+        if not ok:
+            # same as the sequential parser: keep what was parsed before the failure
+            break
+
+def analyze_pdf_sections(pdf_path, progress=None):
+    """
+    Parse the PDF and return:
+      - df: DataFrame of grouped rows (for classifier). Each row contains Start Line and End Line.
+      - lines_list: list of per-physical-line dicts: { line_index, page, text, bbox }
+    Documents longer than PARSE_SHARD_PAGES are split into page ranges parsed in the shared
+    process pool; shard results are merged back in page order with their line indices rebased
+    so Start Line / End Line stay global.
+    progress(pages_done, page_count), if given, is called as pages (inline) or shards (pool) finish.
+    """
+    grouped_rows = []   # will become rows for df (paragraph/group-level)
+    lines_list = []     # one entry per physical text line found in order
+    try:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+
+        pages_done = 0
+
+        def page_finished(n=1):
+            nonlocal pages_done
+            pages_done += n
+            if progress is not None:
+                progress(pages_done, page_count)
+
+        if page_count <= PARSE_SHARD_PAGES:
+            shard_results = [parse_page_range(pdf_path, 0, page_count, on_page=page_finished)]
+        else:
+            pool = get_process_pool()
+            shards = _page_shards(page_count)
+            futures = [pool.submit(parse_page_range, pdf_path, start, end) for start, end in shards]
+            shard_results = []
+            for (start, end), future in zip(shards, futures):
+                shard_results.append(future.result())
+                page_finished(end - start)
+
+        _merge_shards(shard_results, grouped_rows, lines_list)
+    except Exception as e:
+        logger.exception(f"Error processing {pdf_path}: {e}")
+
+    df = pd.DataFrame(grouped_rows)
+    return df, lines_list
+
+def analyze_pdf_sections_batch(pdf_paths):
+    """
+    Parse several PDFs at once. Every page-range shard of every file is queued on the process
+    pool together, so short documents are parsed in parallel with each other as well.
+    Returns [(df, lines_list), ...] in input order; a file that cannot be parsed yields an
+    empty DataFrame and no lines.
+    """
+    pool = get_process_pool()
+    submitted = []
+    for pdf_path in pdf_paths:
+        try:
+            with fitz.open(pdf_path) as doc:
+                page_count = doc.page_count
+            shards = _page_shards(page_count) if page_count > PARSE_SHARD_PAGES else [(0, page_count)]
+            submitted.append([pool.submit(parse_page_range, pdf_path, start, end) for start, end in shards])
+        except Exception as e:
+            logger.exception(f"Error processing {pdf_path}: {e}")
+            submitted.append(None)
+
+    results = []
+    for pdf_path, futures in zip(pdf_paths, submitted):
+        grouped_rows, lines_list = [], []
+        if futures is not None:
+            try:
+                _merge_shards([f.result() for f in futures], grouped_rows, lines_list)
+            except Exception as e:
+                logger.exception(f"Error processing {pdf_path}: {e}")
+        results.append((pd.DataFrame(grouped_rows), lines_list))
+    return results
@@ -0,0 +1,411 @@
+# podcastAudio.py
+import io
+import os
+import re
+import time
+import itertools
+import random
+import logging
+import threading
+import subprocess
+import xml.sax.saxutils as saxutils
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from startupTiming import lazy_import
+from podcastCache import LineCache, content_key, part_path, current_part
+
+logger = logging.getLogger(__name__)
+
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "6"))            # lines synthesized at once, per process
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60"))
+FAKE_TTS_LATENCY = float(os.getenv("FAKE_TTS_LATENCY", "0.2"))
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+PODCAST_BITRATE = os.getenv("PODCAST_BITRATE", "128k")
+
+# every backend returns raw PCM in this one format, so segments can be joined without decoding
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2   # bytes, signed 16-bit little endian
+CHANNELS = 1
+
+
+def parse_script(script):
+    """Split a 'Host: ... / Guest: ...' script into [(text, speaker)] with speaker 'male' (host) or 'female' (guest)."""
+    lines = []
+    for line in script.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith("Host:"):
+            lines.append((line.replace("Host:", "").strip(), "male"))
+        elif line.startswith("Guest:"):
+            lines.append((line.replace("Guest:", "").strip(), "female"))
+        else:
+            lines.append((line.strip(), "male"))
+    return lines
+
+
+#---- TTS backends #
+
+class TTSBackend:
+    """A speech synthesizer returning raw PCM (SAMPLE_RATE, SAMPLE_WIDTH, CHANNELS) for one line of text."""
+    name = "base"
+    male_voices = ()
+    female_voices = ()
+
+    def pick_voices(self, rng=random):
+        """One voice per speaker for a whole podcast."""
+        return {"male": rng.choice(self.male_voices), "female": rng.choice(self.female_voices)}
+
+    def synthesize(self, text, voice):
+        raise NotImplementedError
+
+
+class AzureOpenAITTS(TTSBackend):
+    """Azure OpenAI text-to-speech deployment over HTTP (pooled session), asking for raw 24 kHz PCM."""
+    name = "azure-openai"
+    male_voices = ("alloy", "echo", "onyx")
+    female_voices = ("fable", "nova", "shimmer")
+
+    def __init__(self):
+        endpoint = os.getenv("AZURE_TTS_ENDPOINT")
+        self.api_key = os.getenv("AZURE_TTS_KEY")
+        if not endpoint or not self.api_key:
+            raise ValueError("AZURE_TTS_KEY and AZURE_TTS_ENDPOINT must be set.")
+        self.deployment = os.getenv("AZURE_TTS_DEPLOYMENT", "tts")
+        api_version = os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview")
+        if "/audio/speech" in endpoint:
+            self.url = endpoint  # full deployment URL given
+        else:
+            self.url = (f"{endpoint.rstrip('/')}/openai/deployments/{self.deployment}/audio/speech"
+                        f"?api-version={api_version}")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(1, TTS_WORKERS))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def configured():
+        return bool(os.getenv("AZURE_TTS_KEY") and os.getenv("AZURE_TTS_ENDPOINT"))
+
+    def synthesize(self, text, voice):
+        resp = self.session.post(
+            self.url,
+            headers={"api-key": self.api_key},
+            json={"model": self.deployment, "input": text, "voice": voice, "response_format": "pcm"},
+            timeout=TTS_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.content
+
+
+class CognitiveServicesTTS(TTSBackend):
+    """
+    Azure Speech (Cognitive Services). Audio comes back in memory (no output file), so a synthesizer
+    can be reused: one per worker thread and voice.
+    """
+    name = "azure-speech"
+    male_voices = ("en-IN-ArjunNeural", "en-IN-PrabhatNeural")
+    female_voices = ("en-IN-AartiNeural", "en-IN-AnanyaNeural")
+
+    def __init__(self):
+        key = os.getenv("AZURE_SPEECH_KEY")
+        region = os.getenv("AZURE_SPEECH_REGION", "centralindia")
+        if not key or not region:
+            raise RuntimeError("AZURE_SPEECH_KEY (and AZURE_SPEECH_REGION) must be set for Azure Speech TTS")
+        self.speechsdk = lazy_import("azure.cognitiveservices.speech")
+        self.speech_config = self.speechsdk.SpeechConfig(subscription=key, region=region)
+        self.speech_config.set_speech_synthesis_output_format(
+            self.speechsdk.SpeechSynthesisOutputFormat.Raw24Khz16BitMonoPcm)
+        self._local = threading.local()
+
+    def _synthesizer(self, voice):
+        synthesizers = getattr(self._local, "synthesizers", None)
+        if synthesizers is None:
+            synthesizers = self._local.synthesizers = {}
+        if voice not in synthesizers:
+            synthesizers[voice] = self.speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+        return synthesizers[voice]
+
+    def synthesize(self, text, voice):
+        ssml_text = f"""
+        <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">
+            <voice name="{voice}">
+                <prosody rate="0%">{saxutils.escape(text)}</prosody>
+                <break time="500ms"/>
+            </voice>
+        </speak>
+        """
+        result = self._synthesizer(voice).speak_ssml_async(ssml_text).get()
+        if result.reason != self.speechsdk.ResultReason.SynthesizingAudioCompleted:
+            raise RuntimeError(f"Cognitive Services TTS failed: {result.reason}")
+        return bytes(result.audio_data)
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS (local development); one voice, MP3 decoded to PCM in memory."""
+    name = "gtts"
+    male_voices = ("en",)
+    female_voices = ("en",)
+
+    def synthesize(self, text, voice):
+        buf = io.BytesIO()
+        lazy_import("gtts", "gTTS")(text=text, lang=voice, slow=False).write_to_fp(buf)
+        buf.seek(0)
+        segment = lazy_import("pydub", "AudioSegment").from_file(buf, format="mp3")
+        return segment.set_frame_rate(SAMPLE_RATE).set_channels(CHANNELS).set_sample_width(SAMPLE_WIDTH).raw_data
+
+
+class FakeTTS(TTSBackend):
+    """
+    Offline stand-in (TTS_BACKEND=fake): sleeps FAKE_TTS_LATENCY like a remote call, then returns a
+    tone whose pitch identifies the voice and whose length follows the text.
+    """
+    name = "fake"
+    male_voices = ("fake-low",)
+    female_voices = ("fake-high",)
+    PITCH = {"fake-low": 180.0, "fake-high": 320.0}
+
+    def __init__(self, latency=FAKE_TTS_LATENCY):
+        self.latency = latency
+
+    def synthesize(self, text, voice):
+        threading.Event().wait(self.latency)
+        seconds = min(10.0, 0.3 + 0.05 * len(text))
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        tone = 0.2 * np.sin(2 * np.pi * self.PITCH.get(voice, 240.0) * t)
+        return (tone * 32767).astype("<i2").tobytes()
+
+
+BACKENDS = {cls.name: cls for cls in (AzureOpenAITTS, CognitiveServicesTTS, GTTSBackend, FakeTTS)}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    """Process-wide backend instance (sessions and synthesizers are reused across requests)."""
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def podcast_backend_names():
+    """TTS_BACKEND forces one backend; otherwise Azure OpenAI when configured, then Azure Speech."""
+    forced = os.getenv("TTS_BACKEND")
+    if forced:
+        return [forced.lower()]
+    return (["azure-openai"] if AzureOpenAITTS.configured() else []) + ["azure-speech"]
+
+
+#---- concurrent synthesis #
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _tts_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=max(1, TTS_WORKERS), thread_name_prefix="tts")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+# per-line PCM, shared by every podcast in this process (and across processes on disk)
+line_cache = LineCache()
+
+
+def synthesize_line(backend, text, voice):
+    key = content_key(backend.name, voice, text, SAMPLE_RATE, SAMPLE_WIDTH, CHANNELS)
+    return line_cache.get_or_synthesize(key, lambda: backend.synthesize(text, voice))
+
+
+def synthesize_lines(backend, lines, voices):
+    """
+    PCM for every (text, speaker) line, synthesized concurrently on the shared bounded pool.
+    Returns an iterator yielding in script order, each line as soon as it and the ones before it are done.
+    """
+    return _tts_pool().map(lambda line: synthesize_line(backend, line[0], voices[line[1]]), lines)
+
+
+def synthesize_podcast(lines, backend_names=None, seed=None):
+    """
+    Synthesize the script concurrently, each line with the first backend in backend_names that manages it:
+    a line failing on Azure OpenAI is retried on Azure Speech, so one bad line doesn't lose the podcast.
+    Returns (pcm_segments, backend_name, voices) with the backend and voices of the first line;
+    pcm_segments is an iterator in script order, so the caller can start encoding while later lines are
+    still being synthesized. A seed (e.g. the podcast cache key) makes the voice choice deterministic.
+    """
+    names = list(backend_names or podcast_backend_names())
+    chain = {}  # name -> (backend, voices), or None if it could not be created; built on first use
+    chain_lock = threading.Lock()
+
+    def candidate(name):
+        with chain_lock:
+            if name not in chain:
+                try:
+                    backend = get_backend(name)
+                    voices = backend.pick_voices() if seed is None else backend.pick_voices(random.Random(seed))
+                    chain[name] = (backend, voices)
+                except Exception as e:
+                    logger.warning(f"{name} TTS unavailable: {e}")
+                    chain[name] = None
+            return chain[name]
+
+    def line_pcm(line):
+        text, speaker = line
+        last_error = None
+        for name in names:
+            entry = candidate(name)
+            if entry is None:
+                last_error = last_error or f"{name} unavailable"
+                continue
+            backend, voices = entry
+            try:
+                return name, synthesize_line(backend, text, voices[speaker])
+            except Exception as e:
+                logger.warning(f"{name} TTS failed for a line, trying the next backend: {e}")
+                last_error = e
+        raise RuntimeError(f"No TTS backend succeeded: {last_error}")
+
+    results = _tts_pool().map(line_pcm, lines)
+    first = next(results, None)  # raises when no backend manages the first line
+    name = first[0] if first is not None else names[0]
+    entry = candidate(name)
+    if entry is None:
+        raise RuntimeError(f"No TTS backend available among {', '.join(names)}")
+    logger.info(f"{name} TTS started ({len(lines)} lines)")
+    segments = (pcm for _, pcm in itertools.chain([] if first is None else [first], results))
+    return segments, name, entry[1]
+
+
+def split_narration(text, max_chars=400):
+    """Single-narrator script -> [(chunk, 'male')], sentences grouped up to max_chars, so it can be synthesized in pieces."""
+    chunks = []
+    for paragraph in text.splitlines():
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph.strip()):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                chunks.append((current, "male"))
+                current = ""
+            current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append((current, "male"))
+    return chunks
+
+
+#---- assembly #
+
+def _ffmpeg_mp3_command(output):
+    # no input probing (output starts with the first line) and no Xing header (it is rewritten at the end,
+    # after streaming readers have already sent the start of the file)
+    return [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y",
+            "-probesize", "32", "-analyzeduration", "0",
+            "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+            "-codec:a", "libmp3lame", "-b:a", PODCAST_BITRATE, "-write_xing", "0", "-flush_packets", "1",
+            "-f", "mp3", output]
+
+
+def encode_mp3(pcm_segments, file_path, part=None):
+    """
+    Pipe the PCM segments, in order, through a single ffmpeg process into an MP3 at file_path.
+    Nothing is concatenated in Python and nothing but the output touches the disk; the file grows as
+    this encoder's own <file_path>.<id>.part (see follow_mp3) and is renamed onto file_path when complete.
+    """
+    part = part or part_path(file_path)
+    proc = subprocess.Popen(_ffmpeg_mp3_command(part), stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for pcm in pcm_segments:
+            proc.stdin.write(pcm)
+            proc.stdin.flush()
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its stderr says why
+    except BaseException:
+        proc.kill()
+        proc.communicate()
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        if os.path.exists(part):
+            os.remove(part)
+        raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {stderr.decode(errors='replace').strip()}")
+    os.replace(part, file_path)
+    return file_path
+
+
+#---- streaming #
+
+def start_podcast_stream(lines, file_path, backend_names=None, on_done=None, seed=None):
+    """
+    Synthesize the first line, then encode the rest to file_path in the background.
+    Returns (backend_name, voices) as soon as audio is flowing; follow_mp3(file_path) streams it.
+    on_done(file_path) runs once the MP3 is complete.
+    """
+    segments, backend_name, voices = synthesize_podcast(lines, backend_names, seed)
+    part = part_path(file_path)
+    open(part, "wb").close()  # followers can attach before ffmpeg opens it
+
+    def encode():
+        try:
+            encode_mp3(segments, file_path, part)
+            if on_done is not None:
+                on_done(file_path)
+        except Exception:
+            logger.exception(f"Streaming podcast {os.path.basename(file_path)} failed")
+            if os.path.exists(part):
+                os.remove(part)
+
+    threading.Thread(target=encode, name="podcast-encode", daemon=True).start()
+    return backend_name, voices
+
+
+def podcast_exists(file_path):
+    return os.path.exists(file_path) or current_part(file_path) is not None
+
+
+def follow_mp3(file_path, chunk_size=64 * 1024, poll=0.1, idle_timeout=2 * TTS_TIMEOUT):
+    """
+    Yield the bytes of a podcast MP3, following its .part file while it is still being encoded.
+    Only the filesystem is shared, so any server process can serve a stream started by another.
+    """
+    part = None
+    try:
+        f = open(file_path, "rb")
+    except FileNotFoundError:
+        part = current_part(file_path)
+        if part is None:
+            return
+        try:
+            f = open(part, "rb")
+        except FileNotFoundError:
+            # renamed into place between the two checks
+            try:
+                f = open(file_path, "rb")
+            except FileNotFoundError:
+                return
+            part = None
+    with f:
+        last_data = time.monotonic()
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                last_data = time.monotonic()
+                yield chunk
+                continue
+            if part is None or not os.path.exists(part):
+                # renamed into place (same file: read what was written since the last read) or removed on failure
+                rest = f.read()
+                if rest:
+                    yield rest
+                return
+            if time.monotonic() - last_data > idle_timeout:
+                logger.warning(f"Gave up following {os.path.basename(file_path)}: no new audio for {idle_timeout}s")
+                return
+            time.sleep(poll)
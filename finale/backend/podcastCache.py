@@ -0,0 +1,283 @@
+# podcastCache.py
+import os
+import glob
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+PODCAST_CACHE_TTL = int(os.getenv("PODCAST_CACHE_TTL", str(7 * 24 * 3600)))     # seconds; 0 disables
+PODCAST_CLAIM_TIMEOUT = int(os.getenv("PODCAST_CLAIM_TIMEOUT", "600"))           # seconds before a stalled claim is taken over
+TTS_CACHE_TTL = int(os.getenv("TTS_CACHE_TTL", str(30 * 24 * 3600)))            # seconds; 0 disables
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")                         # empty: memory tier only
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 ** 2)))
+
+
+def content_key(*parts):
+    """sha256 over the JSON of parts (text, backend, voice and format settings)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def part_path(file_path):
+    """A fresh <file_path>.<id>.part for one encoder; renamed onto file_path when complete."""
+    return f"{file_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part"
+
+
+def current_part(file_path):
+    """The newest in-progress <file_path>.*.part, or None."""
+    parts = []
+    for path in glob.glob(f"{glob.escape(file_path)}.*.part"):
+        try:
+            parts.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    return max(parts)[1] if parts else None
+
+
+class PodcastBusy(Exception):
+    """An identical podcast is still being generated by another request."""
+
+
+class PodcastCache:
+    """
+    Podcasts by content key (prompt, LLM and TTS settings). The MP3 lives in the audio folder as
+    podcast_<key>.mp3 next to podcast_<key>.json, the record.
+    - claim(): the first request for a key writes a pending record (under a file lock), so identical
+      requests arriving while it runs the LLM and TTS join it instead of encoding the same file again
+    - put(): the owner completes the record with the script, backend and voices once audio is flowing
+    - release(): the owner drops its claim when it fails before that
+    A pending claim older than claim_timeout, or an in-progress .part that stopped growing for that
+    long, is treated as abandoned.
+    """
+
+    def __init__(self, directory, ttl=PODCAST_CACHE_TTL, claim_timeout=PODCAST_CLAIM_TIMEOUT):
+        self.directory = directory
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self._lock_path = os.path.join(directory, ".podcast_claims.lock")
+        self._thread_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def filename(self, key):
+        return f"podcast_{key[:32]}.mp3"
+
+    def _record_path(self, key):
+        return os.path.join(self.directory, f"podcast_{key[:32]}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._record_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable podcast cache record for {key}: {e}")
+            return None
+
+    def _write(self, key, record):
+        path = self._record_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**record, "created_at": time.time()}, f)
+        os.replace(tmp, path)
+
+    def _state(self, record):
+        """absent | dead | pending (claimed, no audio yet) | encoding | complete"""
+        if record is None:
+            return "absent"
+        now = time.time()
+        age = now - record.get("created_at", 0)
+        if "script" not in record:
+            return "pending" if age <= self.claim_timeout else "dead"
+        if age > self.ttl:
+            return "dead"
+        mp3 = os.path.join(self.directory, record["filename"])
+        if os.path.exists(mp3):
+            return "complete"
+        part = current_part(mp3)
+        try:
+            if part and now - os.path.getmtime(part) <= self.claim_timeout:
+                return "encoding"
+        except FileNotFoundError:
+            return "complete" if os.path.exists(mp3) else "dead"
+        return "dead"  # evicted, or the synthesis failed
+
+    def get(self, key, wait=0, complete=False):
+        """
+        The record (with 'complete') of a usable podcast, or None when there is none and the caller
+        may claim the key. A pending claim, or an MP3 still encoding when complete=True, is waited on
+        for up to `wait` seconds and then raises PodcastBusy.
+        """
+        if not self.enabled:
+            return None
+        deadline = time.monotonic() + wait
+        while True:
+            record = self._read(key)
+            state = self._state(record)
+            if state == "complete":
+                return {**record, "complete": True}
+            if state == "encoding" and not complete:
+                return {**record, "complete": False}
+            if state in ("absent", "dead"):
+                return None
+            if time.monotonic() >= deadline:
+                raise PodcastBusy("An identical podcast is still being generated; retry shortly")
+            time.sleep(0.2)
+
+    @contextmanager
+    def _claims_locked(self):
+        with self._thread_lock, open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def claim(self, key):
+        """True if this caller now owns key (nothing usable or in progress existed)."""
+        if not self.enabled:
+            return True
+        with self._claims_locked():
+            if self._state(self._read(key)) not in ("absent", "dead"):
+                return False
+            self._write(key, {"filename": self.filename(key), "claimed_by": os.getpid()})
+            return True
+
+    def release(self, key):
+        """Drop a claim whose owner failed before producing audio."""
+        if not self.enabled:
+            return
+        with self._claims_locked():
+            if self._state(self._read(key)) == "pending":
+                try:
+                    os.remove(self._record_path(key))
+                except FileNotFoundError:
+                    pass
+
+    def put(self, key, record):
+        if not self.enabled:
+            return
+        try:
+            self._write(key, record)
+        except Exception as e:
+            logger.warning(f"Could not write podcast cache record for {key}: {e}")
+
+
+class LineCache:
+    """
+    Two-tier cache of synthesized PCM per line (backend, voice, text).
+    - memory: LRU bounded by max_bytes of audio
+    - disk: one <key>.pcm per line in `directory`, shared by every server process
+    Concurrent requests for the same line (e.g. a repeated intro) share a single synthesis.
+    """
+
+    def __init__(self, max_bytes=TTS_CACHE_MEMORY_BYTES, ttl=TTS_CACHE_TTL, directory=TTS_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory or None
+        self._memory = OrderedDict()  # key -> pcm
+        self._memory_bytes = 0
+        self._inflight = {}           # key -> Future
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "shared": 0, "misses": 0}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def _remember(self, key, pcm):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = pcm
+            self._memory_bytes += len(pcm)
+            while self._memory_bytes > self.max_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable TTS cache entry {path}: {e}")
+            return None
+
+    def _store(self, key, pcm):
+        self._remember(key, pcm)
+        if self.directory:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(pcm)
+                os.replace(tmp, path)
+            except Exception as e:
+                logger.warning(f"Could not write TTS cache entry {path}: {e}")
+
+    def get_or_synthesize(self, key, synthesize):
+        """Cached PCM for key, or synthesize() it once (other callers for the same key wait for it)."""
+        if not self.enabled:
+            return synthesize()
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return pcm
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self._stats["shared"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            pcm = self._load(key)
+            if pcm is not None:
+                self._remember(key, pcm)
+                stat = "disk_hits"
+            else:
+                pcm = synthesize()
+                self._store(key, pcm)
+                stat = "misses"
+            with self._lock:
+                self._stats[stat] += 1
+            future.set_result(pcm)
+            return pcm
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._stats.values())
+            hits = lookups - self._stats["misses"]
+            return {**self._stats, "entries": len(self._memory), "memory_bytes": self._memory_bytes,
+                    "hit_rate": round(hits / lookups, 4) if lookups else None}
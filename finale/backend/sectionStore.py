@@ -0,0 +1,71 @@
+# sectionStore.py
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_SUFFIX = ".emb.npy"
+SECTIONS_SUFFIX = ".sections.json"
+
+
+def _store_paths(upload_folder, filename):
+    base = os.path.join(upload_folder, filename)
+    return base + EMBEDDINGS_SUFFIX, base + SECTIONS_SUFFIX
+
+
+def save_section_embeddings(upload_folder, filename, sections, embeddings, model_name=None):
+    """
+    Persist the sections built by /upload next to the PDF so queries never re-encode them.
+    - uploads/<filename>.emb.npy        : float32 (n_sections, dim) matrix, row i <-> sections[i]
+    - uploads/<filename>.sections.json  : the section dicts exactly as returned to the client
+    Both files are written to a temp name first and renamed, so readers never see a half write.
+    """
+    emb = np.asarray(embeddings, dtype=np.float32)
+    if emb.ndim != 2 or emb.shape[0] != len(sections):
+        raise ValueError(f"embeddings shape {emb.shape} does not match {len(sections)} sections")
+
+    emb_path, sections_path = _store_paths(upload_folder, filename)
+
+    tmp_emb = emb_path + ".tmp"
+    with open(tmp_emb, "wb") as f:
+        np.save(f, emb)
+    os.replace(tmp_emb, emb_path)
+
+    meta = {
+        "filename": filename,
+        "model": model_name,
+        "count": len(sections),
+        "dim": int(emb.shape[1]),
+        "sections": sections,
+    }
+    tmp_sections = sections_path + ".tmp"
+    with open(tmp_sections, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_sections, sections_path)
+    logger.info(f"Stored {len(sections)} section embeddings for {filename}")
+
+
+def load_section_embeddings(upload_folder, filename):
+    """
+    Return (sections, embeddings) stored for an uploaded file, or None when nothing usable is stored
+    (file uploaded before the store existed, embedder was down at upload time, or files out of sync).
+    """
+    emb_path, sections_path = _store_paths(upload_folder, filename)
+    if not (os.path.exists(emb_path) and os.path.exists(sections_path)):
+        return None
+
+    try:
+        with open(sections_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        embeddings = np.load(emb_path)
+    except Exception as e:
+        logger.warning(f"Failed to read section store for {filename}: {e}")
+        return None
+
+    sections = meta.get("sections") or []
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(sections):
+        logger.warning(f"Section store for {filename} is inconsistent; ignoring it")
+        return None
+    return sections, embeddings
@@ -0,0 +1,72 @@
+# startupTiming.py
+import sys
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_MODULE_LOADED = time.perf_counter()  # app.py imports this first, so this is ~ the start of app import
+
+
+class StartupTiming:
+    """
+    Millisecond timings of startup phases (module imports, model loads, first-use imports).
+    report() logs them slowest first; snapshot() is what /health returns.
+    """
+
+    def __init__(self):
+        self._phases = {}
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def begin(self, label):
+        self._open[label] = time.perf_counter()
+
+    def end(self, label):
+        started = self._open.pop(label, None)
+        if started is not None:
+            self.record(label, (time.perf_counter() - started) * 1000.0)
+
+    @contextmanager
+    def phase(self, label):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(label, (time.perf_counter() - started) * 1000.0)
+
+    def record(self, label, ms):
+        with self._lock:
+            self._phases[label] = round(ms, 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "phases_ms": dict(self._phases),
+                "since_start_ms": round((time.perf_counter() - _MODULE_LOADED) * 1000.0, 1),
+            }
+
+    def report(self):
+        snap = self.snapshot()
+        lines = [f"  {ms:>10.1f} ms  {label}"
+                 for label, ms in sorted(snap["phases_ms"].items(), key=lambda kv: kv[1], reverse=True)]
+        logger.info("Startup timing (%.1f ms since app import began):\n%s", snap["since_start_ms"], "\n".join(lines))
+        return snap
+
+
+startup_timing = StartupTiming()
+
+
+def lazy_import(module, attr=None):
+    """
+    Import `module` on first use (timed as 'lazy import <module>') and return it, or its `attr`.
+    Keeps heavy, route-specific dependencies out of app start-up.
+    """
+    mod = sys.modules.get(module)
+    if mod is None:
+        with startup_timing.phase(f"lazy import {module}"):
+            mod = importlib.import_module(module)
+    return getattr(mod, attr) if attr else mod
@@ -0,0 +1,105 @@
+# streamingUpload.py
+import os
+import hashlib
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+class HashingUploadStream:
+    """
+    File-like sink that Werkzeug's multipart parser writes an uploaded file part into.
+    Chunks go straight to a temp file inside the upload folder while being hashed (SHA-256)
+    and counted; once the part passes max_size the temp file is dropped and the request is
+    aborted with 413, whether or not the client sent a Content-Length. With abort_oversize=False
+    (many-file requests) only this part is given up: the rest of it is read and dropped and
+    too_large is set, so the other parts are still processed.
+    commit() renames the finished temp file into place atomically.
+    """
+
+    def __init__(self, directory, max_size, abort_oversize=True):
+        fd, self.path = tempfile.mkstemp(prefix=".upload_", suffix=".part", dir=directory)
+        self._file = os.fdopen(fd, "w+b")
+        self._sha = hashlib.sha256()
+        self.max_size = max_size
+        self.abort_oversize = abort_oversize
+        self.size = 0
+        self.too_large = False
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.too_large:
+            return len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            if self.abort_oversize:
+                self.discard()
+                raise RequestEntityTooLarge(f"File too large. Maximum size is {self.max_size // (1024 * 1024)}MB")
+            # the parser still seeks/reads this stream: keep it open but empty
+            self._file.seek(0)
+            self._file.truncate()
+            self.too_large = True
+            return len(data)
+        self._sha.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+    def commit(self, dest_path):
+        """Move the received file to dest_path (same filesystem, so the rename is atomic)."""
+        self._file.close()
+        os.replace(self.path, dest_path)
+        self.path = dest_path
+        self.committed = True
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    # file protocol used by the parser / FileStorage
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        # called by Werkzeug when the request ends; an uncommitted upload is removed
+        self.discard()
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request class whose file parts stream into HashingUploadStream instead of a spooled temp file.
+    On endpoints listed in config['PER_PART_SIZE_LIMIT_ENDPOINTS'] an oversized part only fails itself.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        per_part = self.endpoint in current_app.config.get('PER_PART_SIZE_LIMIT_ENDPOINTS', ())
+        return HashingUploadStream(current_app.config['UPLOAD_FOLDER'], current_app.config.get('MAX_FILE_SIZE'),
+                                   abort_oversize=not per_part)
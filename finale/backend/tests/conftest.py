@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the backend modules are flat, imported by name like app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# no on-disk caches in the working tree; tests that want one pass a tmp_path directory
+os.environ.setdefault("LLM_CACHE_DIR", "")
+os.environ.setdefault("TTS_CACHE_DIR", "")
@@ -0,0 +1,41 @@
+import fitz
+import pytest
+
+from RePDFBuilding import highlight_layer_overlays
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    doc = fitz.open()
+    doc.new_page(width=595, height=842)
+    doc.new_page(width=595, height=842)
+    doc.save(str(tmp_path / "a.pdf"))
+    return tmp_path
+
+
+def output(*rects, document="a.pdf", page_number=None):
+    return {"extracted_sections": [{"document": document, "page_number": page_number, "rects": list(rects)}]}
+
+
+def test_overlays_convert_to_pdf_space(upload_folder):
+    overlays = highlight_layer_overlays([(output({"page": 2, "bbox": [50, 100, 300, 120]}), None)],
+                                        upload_folder=str(upload_folder))
+    assert overlays == {"a.pdf": [{"page": 2, "bbox": [50.0, 100.0, 300.0, 120.0],
+                                   "pdf_bbox": [50.0, 722.0, 300.0, 742.0], "color": "#ffff00"}]}
+
+
+def test_layers_keep_their_colour_and_legacy_rects_use_the_section_page(upload_folder):
+    overlays = highlight_layer_overlays([
+        (output({"page": 1, "bbox": [0, 0, 10, 10]}), None),
+        (output([20, 20, 30, 30], page_number=2), (1, 0.6, 0.6)),
+    ], upload_folder=str(upload_folder))
+    assert [(box["page"], box["color"]) for box in overlays["a.pdf"]] == [(1, "#ffff00"), (2, "#ff9999")]
+
+
+def test_out_of_range_pages_and_missing_files_are_skipped(upload_folder):
+    overlays = highlight_layer_overlays([
+        (output({"page": 3, "bbox": [0, 0, 10, 10]}), None),
+        (output({"page": 1, "bbox": [0, 0, 10, 10]}, document="missing.pdf"), None),
+    ], upload_folder=str(upload_folder))
+    assert overlays == {}
+    assert not [p.name for p in upload_folder.iterdir() if p.name != "a.pdf"]
@@ -0,0 +1,144 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import llmProvider
+from llmCache import ResponseCache
+from llmProvider import LLMClient
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """Speaks just enough of the OpenAI chat and Ollama generate APIs; answers echo the prompt."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []       # (path, body) per request, failed ones included
+        self.fail_next = 0       # answer this many upcoming requests with 503
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def prompts(self):
+        return [body["messages"][0]["content"] if "messages" in body else body["prompt"]
+                for _, body in self.requests]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, body))
+            failing = server.fail_next > 0
+            if failing:
+                server.fail_next -= 1
+        if failing:
+            return self._send(503)
+
+        if self.path == "/v1/chat/completions":
+            text = "openai:" + body["messages"][0]["content"]
+            if body["stream"]:
+                events = "".join(f"data: {json.dumps({'choices': [{'delta': {'content': c}}]})}\n\n" for c in text)
+                return self._send(200, (events + "data: [DONE]\n\n").encode(), "text/event-stream")
+            return self._send(200, json.dumps({"choices": [{"message": {"content": text}}]}).encode())
+
+        if self.path == "/api/generate":
+            text = "ollama:" + body["prompt"]
+            if body["stream"]:
+                lines = [json.dumps({"response": c, "done": False}) for c in text]
+                lines.append(json.dumps({"response": "", "done": True}))
+                return self._send(200, ("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+            return self._send(200, json.dumps({"response": text, "done": True}).encode())
+
+        self._send(404)
+
+
+@pytest.fixture
+def stub_server():
+    server = StubLLMServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["openai", "ollama"])
+def client(request, stub_server, monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_PROVIDER", request.param)
+    monkeypatch.setenv("OPENAI_API_BASE", f"{stub_server.url}/v1")
+    monkeypatch.setenv("OLLAMA_BASE_URL", stub_server.url)
+    monkeypatch.setattr(llmProvider, "LLM_BACKOFF_BASE", 0.01)
+    llm = LLMClient()
+    llm.cache = ResponseCache(directory=str(tmp_path / "llm_cache"))
+    return llm
+
+
+def test_generate(client, stub_server):
+    assert client.generate("hello") == f"{client.provider}:hello"
+    assert stub_server.prompts() == ["hello"]
+
+
+def test_generate_is_cached(client, stub_server):
+    assert client.generate("hello") == client.generate("hello")
+    assert len(stub_server.requests) == 1
+    client.generate("hello", use_cache=False)
+    assert len(stub_server.requests) == 2
+
+
+def test_generate_stream(client, stub_server):
+    chunks = list(client.generate_stream("hi there"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == f"{client.provider}:hi there"
+    assert stub_server.requests[0][1]["stream"] is True
+    # the streamed answer was cached and comes back as one chunk
+    assert list(client.generate_stream("hi there")) == [f"{client.provider}:hi there"]
+    assert len(stub_server.requests) == 1
+
+
+def test_generate_batch_dedups_prompts(client, stub_server):
+    prompts = ["a", "b", "a", "c", "b", "a"]
+    answers = client.generate_batch(prompts)
+    assert answers == [f"{client.provider}:{p}" for p in prompts]
+    assert sorted(stub_server.prompts()) == ["a", "b", "c"]
+    # all answered from the cache now
+    assert client.generate_batch(["c", "a"]) == [f"{client.provider}:c", f"{client.provider}:a"]
+    assert len(stub_server.requests) == 3
+
+
+def test_retries_503(client, stub_server):
+    stub_server.fail_next = 2
+    assert client.generate("again", use_cache=False) == f"{client.provider}:again"
+    assert stub_server.prompts() == ["again"] * 3
+
+
+def test_stream_retries_503_before_first_chunk(client, stub_server):
+    stub_server.fail_next = 1
+    assert "".join(client.generate_stream("again", use_cache=False)) == f"{client.provider}:again"
+    assert len(stub_server.requests) == 2
+
+
+def test_gives_up_after_max_retries(client, stub_server, monkeypatch):
+    monkeypatch.setattr(llmProvider, "LLM_MAX_RETRIES", 1)
+    stub_server.fail_next = 5
+    with pytest.raises(llmProvider.requests.HTTPError):
+        client.generate("nope", use_cache=False)
+    assert len(stub_server.requests) == 2
@@ -0,0 +1,88 @@
+import fitz
+import pandas as pd
+import pytest
+
+import pdfParser
+import workerPool
+from pdfParser import analyze_pdf_sections, analyze_pdf_sections_batch, parse_page_range
+
+PAGES = 40
+
+
+def write_manual(path, pages=PAGES):
+    """A manual-like PDF: per page a numbered heading, a few paragraphs, a bullet list."""
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=595, height=842)
+        y = 72
+        page.insert_text((72, y), f"{p + 1}. Chapter {p + 1} overview", fontsize=18)
+        y += 36
+        for para in range(2 + p % 3):
+            for line in range(3):
+                page.insert_text((72, y), f"Paragraph {para} line {line} on page {p + 1}, with body text.", fontsize=10)
+                y += 14
+            y += 10
+        for item in range(p % 4):
+            page.insert_text((84, y), f"- bullet {item} of page {p + 1}", fontsize=10)
+            y += 14
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.fixture
+def manual(tmp_path):
+    path = tmp_path / "manual.pdf"
+    write_manual(path)
+    return str(path)
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    """Force the process-pool path: 4-page shards over a 3-process pool."""
+    monkeypatch.setattr(pdfParser, "PARSE_SHARD_PAGES", 4)
+    monkeypatch.setattr(pdfParser, "PARSE_WORKERS", 3)
+    monkeypatch.setattr(workerPool, "PARSE_WORKERS", 3)
+    monkeypatch.setattr(workerPool, "_pool", None)
+    yield
+    if workerPool._pool is not None:
+        workerPool._pool.shutdown()
+
+
+def serial(path):
+    """The single-pass parse: every page in order in this process."""
+    rows, lines, ok = parse_page_range(path, 0, fitz.open(path).page_count)
+    assert ok
+    return pd.DataFrame(rows), lines
+
+
+def test_sharded_parse_matches_serial(manual, sharded):
+    expected_df, expected_lines = serial(manual)
+    assert len(pdfParser._page_shards(PAGES)) > 1
+
+    pages_seen = []
+    df, lines = analyze_pdf_sections(manual, progress=lambda done, total: pages_seen.append((done, total)))
+
+    assert pages_seen[-1] == (PAGES, PAGES)
+    assert lines == expected_lines
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_line_indices_are_global(manual, sharded):
+    df, lines = analyze_pdf_sections(manual)
+    assert [rec['line_index'] for rec in lines] == list(range(len(lines)))
+    assert sorted({rec['page'] for rec in lines}) == sorted(set(df['Page Number']))
+    for row in df.to_dict('records'):
+        covered = lines[row['Start Line']:row['End Line'] + 1]
+        assert covered and {rec['page'] for rec in covered} == {row['Page Number']}
+    # rows stay in document order across shard boundaries
+    assert list(df['Start Line']) == sorted(df['Start Line'])
+
+
+def test_batch_matches_serial(manual, tmp_path, sharded):
+    short = tmp_path / "short.pdf"
+    write_manual(short, pages=3)
+    results = analyze_pdf_sections_batch([manual, str(short)])
+    for path, (df, lines) in zip([manual, str(short)], results):
+        expected_df, expected_lines = serial(path)
+        assert lines == expected_lines
+        pd.testing.assert_frame_equal(df, expected_df)
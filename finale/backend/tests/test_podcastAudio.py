@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+import pytest
+
+import podcastAudio
+from podcastAudio import FakeTTS, TTSBackend, SAMPLE_RATE, parse_script, synthesize_podcast
+from podcastCache import LineCache
+
+LATENCY = 0.1
+
+
+class CountingFakeTTS(FakeTTS):
+    name = "fake"
+
+    def __init__(self, latency=LATENCY):
+        super().__init__(latency)
+        self.calls = []
+
+    def synthesize(self, text, voice):
+        self.calls.append((text, voice))
+        return super().synthesize(text, voice)
+
+
+class BrokenTTS(TTSBackend):
+    name = "broken"
+    male_voices = ("broken-m",)
+    female_voices = ("broken-f",)
+
+    def synthesize(self, text, voice):
+        raise RuntimeError("synthesis failed")
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    backend = CountingFakeTTS()
+    monkeypatch.setitem(podcastAudio._backends, "fake", backend)
+    monkeypatch.setattr(podcastAudio, "line_cache", LineCache(directory=""))
+    return backend
+
+
+def pitch(pcm):
+    """Dominant frequency of a FakeTTS tone, from its zero crossings."""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float64)
+    crossings = np.count_nonzero(np.diff(np.signbit(samples)))
+    return crossings / 2 / (len(samples) / SAMPLE_RATE)
+
+
+def script(n):
+    return "\n".join(f"{'Host' if i % 2 == 0 else 'Guest'}: line {i} " + "word " * (i % 5) for i in range(n))
+
+
+def test_segments_come_back_in_script_order(fake):
+    lines = parse_script(script(8))
+    segments, name, voices = synthesize_podcast(lines, backend_names=["fake"])
+    reference = FakeTTS(latency=0)
+    assert name == "fake"
+    assert list(segments) == [reference.synthesize(text, voices[speaker]) for text, speaker in lines]
+
+
+def test_lines_are_synthesized_concurrently(fake):
+    lines = parse_script(script(12))
+    start = time.monotonic()
+    segments, _, _ = synthesize_podcast(lines, backend_names=["fake"])
+    assert len(list(segments)) == 12
+    elapsed = time.monotonic() - start
+    assert podcastAudio.TTS_WORKERS > 1
+    assert elapsed < len(lines) * LATENCY / 2, f"{elapsed:.2f}s looks sequential"
+
+
+def test_each_speaker_keeps_one_voice(fake):
+    lines = parse_script(script(6))
+    segments, _, voices = synthesize_podcast(lines, backend_names=["fake"])
+    assert voices == {"male": "fake-low", "female": "fake-high"}
+    pitches = [pitch(pcm) for pcm in segments]
+    for (_, speaker), hz in zip(lines, pitches):
+        expected = FakeTTS.PITCH[voices[speaker]]
+        assert abs(hz - expected) < 5, (speaker, hz)
+    assert {voice for _, voice in fake.calls} == {"fake-low", "fake-high"}
+
+
+def test_repeated_lines_are_synthesized_once(fake):
+    lines = parse_script("Host: Welcome back.\nGuest: Thanks.\nHost: Welcome back.\nGuest: Thanks.")
+    segments, _, _ = synthesize_podcast(lines, backend_names=["fake"])
+    segments = list(segments)
+    assert segments[0] == segments[2] and segments[1] == segments[3]
+    assert sorted(text for text, _ in fake.calls) == ["Thanks.", "Welcome back."]
+
+
+def test_failed_lines_fall_back_to_the_next_backend(fake, monkeypatch):
+    monkeypatch.setitem(podcastAudio._backends, "broken", BrokenTTS())
+    lines = parse_script(script(4))
+    segments, name, voices = synthesize_podcast(lines, backend_names=["broken", "fake"])
+    assert name == "fake"
+    assert voices == {"male": "fake-low", "female": "fake-high"}
+    assert len(list(segments)) == 4
+    assert len(fake.calls) == 4
+
+
+def test_no_working_backend_raises(monkeypatch):
+    monkeypatch.setitem(podcastAudio._backends, "broken", BrokenTTS())
+    monkeypatch.setattr(podcastAudio, "line_cache", LineCache(directory=""))
+    with pytest.raises(RuntimeError):
+        synthesize_podcast(parse_script("Host: hi"), backend_names=["broken"])
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import signal
+import threading
+
+import uploadJobs
+from uploadJobs import UploadJobs
+
+
+def work(pages, progress=None, delay=0.01):
+    for i in range(pages):
+        time.sleep(delay)
+        progress('pages_parsed', i + 1, pages)
+    return {"pages": pages}
+
+
+def wait_until_finished(jobs, job_id):
+    record = jobs.get(job_id)
+    while record["status"] not in ("done", "failed"):
+        record = jobs.wait_for_update(job_id, record["version"], timeout=5)
+    return record
+
+
+def test_other_worker_sees_progress_and_result(tmp_path):
+    owner, other = UploadJobs(str(tmp_path)), UploadJobs(str(tmp_path))
+    job_id = owner.submit(work, 20)
+    record = wait_until_finished(other, job_id)
+    assert record["status"] == "done"
+    assert record["result"] == {"pages": 20}
+    assert record["stages"]["pages_parsed"] == {"done": 20, "total": 20}
+
+
+def test_unknown_and_malformed_ids(tmp_path):
+    jobs = UploadJobs(str(tmp_path))
+    assert jobs.get("0" * 32) is None
+    assert jobs.get("../../etc/passwd") is None
+
+
+def test_job_of_a_dead_worker_fails(tmp_path):
+    started = tmp_path / "started"
+    pid = os.fork()
+    if pid == 0:
+        try:
+            jobs = UploadJobs(str(tmp_path / "jobs"))
+            jobs.submit(lambda progress=None: time.sleep(60))
+            started.write_text("")
+            time.sleep(60)
+        finally:
+            os._exit(0)
+    deadline = time.monotonic() + 10
+    while not started.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+
+    jobs = UploadJobs(str(tmp_path / "jobs"))
+    (job_file,) = (tmp_path / "jobs").glob("*.json")
+    record = jobs.get(job_file.stem)
+    assert record["status"] == "failed"
+    assert "exited" in record["error"]["details"]
+    # the verdict is written back for everyone else
+    assert json.loads(job_file.read_text())["status"] == "failed"
+
+
+def test_stale_heartbeat_fails_the_job(tmp_path, monkeypatch):
+    jobs = UploadJobs(str(tmp_path))
+    release = threading.Event()
+    job_id = jobs.submit(lambda progress=None: release.wait(5))
+    try:
+        path = tmp_path / f"{job_id}.json"
+        record = json.loads(path.read_text())
+        record["owner"].update(host="elsewhere", heartbeat_at=time.time() - 120)
+        path.write_text(json.dumps(record))
+        monkeypatch.setattr(uploadJobs, "UPLOAD_JOB_STALE", 60)
+        assert UploadJobs(str(tmp_path)).get(job_id)["status"] == "failed"
+    finally:
+        release.set()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from vectorIndex import IVFIndex
+
+DIM = 32
+
+
+def unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def corpus():
+    """200 documents of 10 sections each, drawn around 40 topics so the IVF lists mean something."""
+    rng = np.random.default_rng(0)
+    topics = unit(rng.standard_normal((40, DIM)))
+    labels = rng.integers(0, len(topics), size=2000)
+    return unit(topics[labels] + 0.1 * rng.standard_normal((2000, DIM))).reshape(200, 10, DIM)
+
+
+def fill(index, corpus, background=False):
+    for d, sections in enumerate(corpus):
+        assert index.add(f"doc{d}.pdf", sections, background=background) == len(sections)
+
+
+def test_add_then_search_finds_the_section(tmp_path, corpus):
+    index = IVFIndex(str(tmp_path), min_train=10 ** 6)  # exact scan
+    fill(index, corpus[:20])
+    assert len(index) == 200
+    filename, section, score = index.search(corpus[7][3], top_k=1)[0]
+    assert (filename, section) == ("doc7.pdf", 3)
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_recall_against_brute_force(tmp_path, corpus):
+    index = IVFIndex(str(tmp_path), nprobe=8, min_train=500)
+    fill(index, corpus)
+    assert index.centroids is not None and len(index.centroids) > 2 * index.nprobe  # probes a fraction of the lists
+    flat = corpus.reshape(-1, DIM)
+    rng = np.random.default_rng(1)
+    queries = unit(flat[rng.choice(len(flat), 50, replace=False)] + 0.1 * rng.standard_normal((50, DIM)))
+
+    found = expected = 0
+    for q in queries:
+        exact = np.argsort(-(flat @ q))[:10]
+        truth = {(f"doc{i // 10}.pdf", int(i % 10)) for i in exact}
+        hits = {(f, s) for f, s, _ in index.search(q, top_k=10)}
+        found += len(hits & truth)
+        expected += len(truth)
+    assert found / expected >= 0.9
+
+
+def test_readding_a_file_is_a_noop(tmp_path, corpus):
+    index = IVFIndex(str(tmp_path), min_train=10 ** 6)
+    fill(index, corpus[:3])
+    assert index.add("doc1.pdf", corpus[5]) == 0
+    assert len(index) == 30
+    assert index.search(corpus[5][0], top_k=1)[0][:2] != ("doc1.pdf", 0)
+
+
+def test_reopen_from_disk_and_pick_up_other_writers(tmp_path, corpus):
+    first = IVFIndex(str(tmp_path), min_train=500)
+    fill(first, corpus[:100])
+    reopened = IVFIndex(str(tmp_path), min_train=500)
+    assert len(reopened) == len(first) == 1000
+    assert reopened.trained_on == first.trained_on
+    assert reopened.search(corpus[42][1], top_k=1)[0][:2] == ("doc42.pdf", 1)
+
+    # incremental adds by one instance are tail-read by the other
+    for d in range(100, 120):
+        reopened.add(f"doc{d}.pdf", corpus[d], background=False)
+    assert first.search(corpus[115][9], top_k=1)[0][:2] == ("doc115.pdf", 9)
+    assert len(first) == 1200
+
+
+def test_background_retrain_keeps_serving(tmp_path, corpus):
+    index = IVFIndex(str(tmp_path), min_train=500)
+    fill(index, corpus[:60], background=True)
+    if index._trainer is not None:
+        index._trainer.join()
+    fill_more = [(f"doc{d}.pdf", corpus[d]) for d in range(60, 80)]
+    for filename, sections in fill_more:
+        index.add(filename, sections)
+    if index._trainer is not None:
+        index._trainer.join()
+    assert index.centroids is not None
+    assert sum(len(ids) for ids in index._lists) == len(index) == 800
+    assert index.search(corpus[75][4], top_k=1)[0][:2] == ("doc75.pdf", 4)
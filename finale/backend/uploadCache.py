@@ -0,0 +1,55 @@
+# uploadCache.py
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = "_by_hash"
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def stored_filename(digest, original_name):
+    """Name under which the single stored copy of this content lives in uploads/."""
+    return f"{digest[:16]}_{original_name}"
+
+
+def _record_path(upload_folder, digest):
+    return os.path.join(upload_folder, CACHE_DIRNAME, f"{digest}.json")
+
+
+def lookup_upload(upload_folder, digest):
+    """
+    Return the /upload response previously produced for this content hash, or None.
+    A record whose stored PDF has since disappeared is treated as a miss.
+    """
+    path = _record_path(upload_folder, digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except Exception as e:
+        logger.warning(f"Unreadable upload cache record {path}: {e}")
+        return None
+    if not os.path.exists(os.path.join(upload_folder, payload.get("filename", ""))):
+        return None
+    return payload
+
+
+def record_upload(upload_folder, digest, payload):
+    """Remember the /upload response (filename, outline, sections) for this content hash."""
+    path = _record_path(upload_folder, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
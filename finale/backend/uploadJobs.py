@@ -0,0 +1,208 @@
+# uploadJobs.py
+import os
+import re
+import json
+import time
+import uuid
+import copy
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+UPLOAD_JOB_TTL = int(os.getenv("UPLOAD_JOB_TTL", "3600"))  # seconds a finished job stays queryable
+UPLOAD_JOB_POLL = float(os.getenv("UPLOAD_JOB_POLL", "0.25"))            # seconds between record re-reads while waiting
+UPLOAD_JOB_WRITE_INTERVAL = float(os.getenv("UPLOAD_JOB_WRITE_INTERVAL", "0.2"))  # min seconds between progress writes
+UPLOAD_JOB_HEARTBEAT = float(os.getenv("UPLOAD_JOB_HEARTBEAT", "10"))    # seconds between owner heartbeats
+UPLOAD_JOB_STALE = float(os.getenv("UPLOAD_JOB_STALE", "60"))            # heartbeat age after which an unfinished job failed
+
+STAGES = ('pages_parsed', 'rows_classified', 'sections_embedded')
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadJobs:
+    """
+    Registry of background upload jobs, shared by every server process.
+    Each job runs fn(*args, progress=callback) on a bounded thread pool in the process that accepted
+    it; the callback records per-stage {done, total} counters that the status endpoint reports or
+    streams. Records live as <directory>/<job_id>.json (replaced atomically on every change), so a
+    status request answered by another worker sees the same job.
+    Each record names its owner process and carries a heartbeat the owner refreshes while the job is
+    unfinished; a reader that finds the owner gone (same host) or the heartbeat stale marks it failed.
+    """
+
+    def __init__(self, directory, max_workers=UPLOAD_JOB_WORKERS, ttl=UPLOAD_JOB_TTL):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="upload-job")
+        self._ttl = ttl
+        self._jobs = {}       # job_id -> record, for jobs still running in this process
+        self._written = {}    # job_id -> time of the last write of its record
+        self._cond = threading.Condition()
+        self._heartbeat_pid = None
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write(self, job):
+        job["owner"]["heartbeat_at"] = time.time()
+        path = self._path(job["job_id"])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job, f)
+            os.replace(tmp, path)
+            self._written[job["job_id"]] = time.time()
+        except Exception as e:
+            logger.warning(f"Could not write upload job record {path}: {e}")
+
+    def _read(self, job_id):
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable upload job record {job_id}: {e}")
+            return None
+        if job["status"] in ("done", "failed"):
+            return None if time.time() - job["updated_at"] > self._ttl else job
+        reason = self._orphaned(job)
+        if reason is not None:
+            return self._fail_orphan(job, reason)
+        return job
+
+    @staticmethod
+    def _orphaned(job):
+        """Why an unfinished job's owner can no longer finish it, or None."""
+        owner = job.get("owner") or {}
+        if owner.get("host") == socket.gethostname() and owner.get("pid"):
+            try:
+                os.kill(owner["pid"], 0)
+            except ProcessLookupError:
+                return f"worker process {owner['pid']} exited"
+            except PermissionError:
+                pass  # alive, just not ours to signal
+        if time.time() - owner.get("heartbeat_at", 0) > UPLOAD_JOB_STALE:
+            return f"no heartbeat from worker process {owner.get('pid')} for {UPLOAD_JOB_STALE:g}s"
+        return None
+
+    def _fail_orphan(self, job, reason):
+        logger.warning(f"Upload job {job['job_id']} failed: {reason}")
+        job.update(status="failed", updated_at=time.time(), version=job["version"] + 1,
+                   error={"error": "Upload worker stopped before finishing", "details": reason, "status": 500})
+        self._write(job)
+        return job
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(UPLOAD_JOB_HEARTBEAT / 2)
+            with self._cond:
+                if self._heartbeat_pid != os.getpid():
+                    return  # forked copy of another process's thread state
+                now = time.time()
+                for job_id, job in self._jobs.items():
+                    if now - self._written.get(job_id, 0) >= UPLOAD_JOB_HEARTBEAT:
+                        self._write(job)
+
+    def _start_heartbeat(self):
+        # called with self._cond held; one heartbeat thread per process, started with its first job
+        if self._heartbeat_pid != os.getpid():
+            self._heartbeat_pid = os.getpid()
+            threading.Thread(target=self._heartbeat_loop, name="upload-job-heartbeat", daemon=True).start()
+
+    def submit(self, fn, *args, error_type=None):
+        """Queue fn and return its job id. Exceptions of error_type expose their .message/.status."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "stages": {stage: {"done": 0, "total": None} for stage in STAGES},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "version": 0,
+            "owner": {"pid": os.getpid(), "host": socket.gethostname()},
+        }
+        with self._cond:
+            self._start_heartbeat()
+            self._jobs[job_id] = job
+            self._write(job)
+        self._executor.submit(self._run, job_id, fn, args, error_type)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+            job["version"] += 1
+            self._write(job)
+            if job["status"] in ("done", "failed"):
+                # the record on disk is the only copy from here on
+                del self._jobs[job_id]
+                self._written.pop(job_id, None)
+            self._cond.notify_all()
+
+    def _progress(self, job_id, stage, done, total):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["stages"][stage] = {"done": done, "total": total}
+            job["updated_at"] = time.time()
+            job["version"] += 1
+            # per-page ticks are coalesced; a finished stage is always written
+            if done == total or job["updated_at"] - self._written.get(job_id, 0) >= UPLOAD_JOB_WRITE_INTERVAL:
+                self._write(job)
+            self._cond.notify_all()
+
+    def _run(self, job_id, fn, args, error_type):
+        self._update(job_id, status="running")
+        try:
+            result = fn(*args, progress=lambda stage, done, total: self._progress(job_id, stage, done, total))
+            self._update(job_id, status="done", result=result)
+        except Exception as e:
+            if error_type is not None and isinstance(e, error_type):
+                self._update(job_id, status="failed", error={"error": e.message, "status": e.status})
+            else:
+                logger.exception(f"Upload job {job_id} failed")
+                self._update(job_id, status="failed", error={"error": "Internal server error", "details": str(e), "status": 500})
+
+    def get(self, job_id):
+        """Snapshot of the job record, or None for unknown/expired ids."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return copy.deepcopy(job)
+        return self._read(job_id)
+
+    def wait_for_update(self, job_id, version, timeout=15.0):
+        """
+        Block until the job's version moves past `version` (or timeout) and return a snapshot.
+        Jobs running in this process wake the waiter directly; others are re-read every UPLOAD_JOB_POLL.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                remaining = max(0.0, deadline - time.monotonic())
+                if job_id in self._jobs:
+                    # finishing drops the job from _jobs, so that wakes us as well
+                    self._cond.wait_for(
+                        lambda: job_id not in self._jobs or self._jobs[job_id]["version"] != version,
+                        timeout=remaining)
+                else:
+                    self._cond.wait(timeout=min(UPLOAD_JOB_POLL, remaining))
+            job = self.get(job_id)
+            if job is None or job["version"] != version or time.monotonic() >= deadline:
+                return job
@@ -0,0 +1,368 @@
+# vectorIndex.py
+import os
+import json
+import fcntl
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+ENTRY_DTYPE = np.dtype([("doc", "<i4"), ("section", "<i4")])
+
+
+class IVFIndex:
+    """
+    Library-wide inverted-file (IVF) index over every stored section embedding.
+
+    On-disk layout (all inside `directory`):
+      - vectors.f32    : raw float32 rows, appended on every add and memory-mapped for search
+      - entries.i32    : one fixed-width (doc id, section_index) int32 pair per row, memory-mapped
+      - docs.jsonl     : filename table, one JSON string per line; line i is doc id i
+      - assign.i32     : raw int32 coarse-centroid id per row (only once trained)
+      - centroids.npy  : (nlist, dim) k-means centroids
+      - meta.json      : { dim, nlist, trained_on }
+
+    Until `min_train` vectors exist, search is an exact scan of the memmap. After that the index is
+    trained with spherical k-means (nlist ~ sqrt(n)) and a query only scores the rows of the
+    `nprobe` closest lists. The index retrains itself whenever it doubles in size: k-means runs on a
+    background thread without the file lock (one trainer at a time across processes, via .train.lock),
+    new rows keep being assigned to the current centroids meanwhile, and the result is swapped in
+    under a short exclusive lock.
+
+    Every file is append-only between retrains, so picking up another worker's adds only reads the
+    new rows and filenames. Writers hold an exclusive flock on .lock, readers a shared one while
+    they catch up.
+    """
+
+    def __init__(self, directory, nprobe=8, min_train=2048, max_nlist=4096):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.max_nlist = max_nlist
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._entries_path = os.path.join(directory, "entries.i32")
+        self._docs_path = os.path.join(directory, "docs.jsonl")
+        self._assign_path = os.path.join(directory, "assign.i32")
+        self._centroids_path = os.path.join(directory, "centroids.npy")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._file_lock_path = os.path.join(directory, ".lock")
+        self._train_lock_path = os.path.join(directory, ".train.lock")
+        self._trainer = None
+
+        self._reset()
+        self._refresh_if_stale()
+
+    # ------------------------- state -------------------------
+    @contextmanager
+    def _file_locked(self, mode):
+        with open(self._file_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            yield
+
+    def _disk_signature(self):
+        sig = []
+        for path in (self._vectors_path, self._entries_path, self._docs_path,
+                     self._assign_path, self._centroids_path, self._meta_path):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _reset(self):
+        self.dim = None
+        self.trained_on = 0
+        self.centroids = None
+        self._lists = None
+        self._assign_rows = 0
+        self._docs = []           # doc id -> filename
+        self.filenames = {}       # filename -> doc id
+        self._docs_offset = 0     # bytes of docs.jsonl already read
+        self._entries = np.zeros(0, dtype=ENTRY_DTYPE)
+        self._signature = None
+
+    def _read_tail(self, path, offset):
+        """Complete lines appended to path since byte offset, and the offset after them."""
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b"\n") + 1
+        return data[:end].splitlines(), offset + end
+
+    def _sync(self):
+        """Catch up with the files on disk, reading only what was appended since the last sync."""
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+        self.dim = meta.get("dim")
+
+        lines, self._docs_offset = self._read_tail(self._docs_path, self._docs_offset)
+        for line in lines:
+            if line.strip():
+                fname = json.loads(line)
+                self.filenames[fname] = len(self._docs)
+                self._docs.append(fname)
+
+        try:
+            n = os.path.getsize(self._entries_path) // ENTRY_DTYPE.itemsize
+        except FileNotFoundError:
+            n = 0
+        entries = np.memmap(self._entries_path, dtype=ENTRY_DTYPE, mode="r", shape=(n,)) if n else \
+            np.zeros(0, dtype=ENTRY_DTYPE)
+        # rows are in doc order; rows past the last known filename belong to an add that never committed
+        self._entries = entries[:int(np.searchsorted(entries["doc"], len(self._docs)))]
+
+        trained_on = meta.get("trained_on", 0)
+        if trained_on != self.trained_on:
+            # retrained elsewhere: new centroids and a rewritten assign.i32
+            self.centroids = None
+            self._lists = None
+            self._assign_rows = 0
+        self.trained_on = trained_on
+        if self.trained_on and os.path.exists(self._centroids_path) and os.path.exists(self._assign_path):
+            if self.centroids is None:
+                self.centroids = np.load(self._centroids_path)
+                self._lists = [np.zeros(0, dtype=np.int64) for _ in range(len(self.centroids))]
+            with open(self._assign_path, "rb") as f:
+                f.seek(self._assign_rows * 4)
+                assign = np.frombuffer(f.read(4 * max(0, len(self._entries) - self._assign_rows)), dtype=np.int32)
+            self._extend_lists(self._assign_rows, assign)
+            self._assign_rows += len(assign)
+
+    def _refresh_if_stale(self, locked=False):
+        # another worker process may have appended (or retrained) since we last looked;
+        # locked: the caller already holds the exclusive file lock
+        if self._disk_signature() == self._signature:
+            return
+        if locked:
+            self._catch_up()
+        else:
+            with self._file_locked(fcntl.LOCK_SH):
+                self._catch_up()
+
+    def _catch_up(self):
+        signature = self._disk_signature()
+        if any(old is not None and (new is None or new[1] < old[1])
+               for old, new in zip(self._signature or (), signature)):
+            self._reset()  # a file shrank or vanished: the index was rebuilt or removed
+        self._sync()
+        self._signature = signature
+
+    def _extend_lists(self, start, assign):
+        if len(assign) == 0:
+            return
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self._lists) + 1))
+        for c in range(len(self._lists)):
+            if bounds[c + 1] > bounds[c]:
+                self._lists[c] = np.concatenate([self._lists[c], start + order[bounds[c]:bounds[c + 1]]])
+
+    def _vectors(self):
+        n = len(self._entries)
+        if n == 0 or not self.dim:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------- writes -------------------------
+    def add(self, filename, embeddings, background=True):
+        """
+        Append one document's section embeddings (row i <-> section i). Re-adding a filename is a no-op.
+        A retrain this add makes due runs on a background thread, or before returning with
+        background=False (e.g. a start-up backfill in a process that is about to fork).
+        """
+        emb = np.asarray(embeddings, dtype=np.float32)
+        if emb.ndim != 2 or emb.shape[0] == 0:
+            return 0
+        norms = np.linalg.norm(emb, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        emb = np.ascontiguousarray(emb / norms, dtype=np.float32)
+
+        with self._lock, self._file_locked(fcntl.LOCK_EX):
+            self._refresh_if_stale(locked=True)
+            if filename in self.filenames:
+                return 0
+            if self.dim is None:
+                self.dim = int(emb.shape[1])
+                self._write_meta()
+            elif emb.shape[1] != self.dim:
+                raise ValueError(f"embedding dim {emb.shape[1]} does not match index dim {self.dim}")
+
+            start = len(self._entries)
+            doc_id = len(self._docs)
+            rows = np.empty(emb.shape[0], dtype=ENTRY_DTYPE)
+            rows["doc"] = doc_id
+            rows["section"] = np.arange(emb.shape[0])
+            # the filename goes last and commits the add; truncating first drops rows a crashed add left behind
+            self._append(self._vectors_path, start * self.dim * 4, emb.tobytes())
+            self._append(self._entries_path, start * ENTRY_DTYPE.itemsize, rows.tobytes())
+            if self.centroids is not None:
+                assign = np.argmax(emb @ self.centroids.T, axis=1).astype(np.int32)
+                self._append(self._assign_path, start * 4, assign.tobytes())
+            with open(self._docs_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(filename) + "\n")
+
+            # read our own rows back the same way another worker would
+            self._sync()
+            self._signature = self._disk_signature()
+            due = self._train_due()
+
+        if due:
+            if background:
+                self._train_in_background()
+            else:
+                self._train()
+        return emb.shape[0]
+
+    def _train_due(self, n=None):
+        n = len(self._entries) if n is None else n
+        return (self.centroids is None and n >= self.min_train) or bool(self.trained_on and n >= 2 * self.trained_on)
+
+    def _train_in_background(self):
+        with self._lock:
+            if self._trainer is not None and self._trainer.is_alive():
+                return
+            self._trainer = threading.Thread(target=self._train_logged, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    def _train_logged(self):
+        try:
+            self._train()
+        except Exception:
+            logger.exception("IVF index training failed")
+
+    @staticmethod
+    def _append(path, size, data):
+        with open(path, "ab") as f:
+            f.truncate(size)
+            f.write(data)
+
+    def _write_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "nlist": 0 if self.centroids is None else int(len(self.centroids)),
+                "trained_on": self.trained_on
+            }, f)
+        os.replace(tmp, self._meta_path)
+
+    def _train(self, iterations=10, seed=0, chunk=65536):
+        with open(self._train_lock_path, "a") as train_lock:
+            try:
+                fcntl.flock(train_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # another process is training; its result is picked up on refresh
+            with self._lock:
+                self._refresh_if_stale()
+                if not self._train_due():
+                    return
+                vectors = self._vectors()
+
+            # the slow part runs unlocked over a snapshot of the first n rows (rows are append-only)
+            n = vectors.shape[0]
+            nlist = int(min(self.max_nlist, max(1, np.sqrt(n))))
+            rng = np.random.default_rng(seed)
+            sample_size = min(n, nlist * 64)
+            sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))])
+
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                empty = norms[:, 0] == 0
+                norms[empty] = 1.0
+                # keep the previous centroid for empty clusters
+                centroids = np.where(empty[:, None], centroids, sums / norms).astype(np.float32)
+
+            assign = self._assign_rows_to(vectors, centroids, 0, n, chunk)
+
+            with self._lock, self._file_locked(fcntl.LOCK_EX):
+                self._refresh_if_stale(locked=True)
+                # rows added while k-means ran
+                vectors = self._vectors()
+                total = vectors.shape[0]
+                assign = np.concatenate([assign, self._assign_rows_to(vectors, centroids, n, total, chunk)])
+
+                tmp_assign = self._assign_path + ".tmp"
+                assign.tofile(tmp_assign)
+                os.replace(tmp_assign, self._assign_path)
+                tmp_centroids = self._centroids_path + ".tmp"
+                with open(tmp_centroids, "wb") as f:
+                    np.save(f, centroids)
+                os.replace(tmp_centroids, self._centroids_path)
+
+                self.centroids = centroids
+                self._lists = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+                self._extend_lists(0, assign)
+                self._assign_rows = total
+                self.trained_on = n
+                self._write_meta()
+                self._signature = self._disk_signature()
+            logger.info(f"IVF index trained: {n} vectors, {nlist} lists")
+
+    @staticmethod
+    def _assign_rows_to(vectors, centroids, start, stop, chunk):
+        assign = np.empty(stop - start, dtype=np.int32)
+        for s in range(start, stop, chunk):
+            e = min(stop, s + chunk)
+            assign[s - start:e - start] = np.argmax(np.asarray(vectors[s:e]) @ centroids.T, axis=1)
+        return assign
+
+    # ------------------------- reads -------------------------
+    def search(self, query_emb, top_k=10, nprobe=None):
+        """
+        Return up to top_k (filename, section_index, score) tuples ordered by cosine similarity.
+        Exact scan while untrained, IVF probe of the nprobe nearest lists afterwards.
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            vectors = self._vectors()
+            centroids = self.centroids
+            lists = self._lists
+            entries = self._entries
+            docs = self._docs
+
+        n = vectors.shape[0]
+        if n == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query_emb, dtype=np.float32).reshape(-1)
+        q_norm = np.linalg.norm(q)
+        if q_norm > 0:
+            q = q / q_norm
+
+        if centroids is None:
+            candidates = None
+            scores = np.asarray(vectors) @ q
+        else:
+            probe = min(nprobe or self.nprobe, len(centroids))
+            nearest = np.argpartition(-(centroids @ q), probe - 1)[:probe]
+            candidates = np.concatenate([lists[c] for c in nearest])
+            # sorted ids keep memmap reads sequential
+            candidates = np.sort(candidates[candidates < n])
+            if candidates.size == 0:
+                return []
+            scores = np.asarray(vectors[candidates]) @ q
+
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        ids = top if candidates is None else candidates[top]
+        rows = entries[ids]
+        return [(docs[int(doc)], int(section), float(scores[t]))
+                for doc, section, t in zip(rows["doc"], rows["section"], top)]
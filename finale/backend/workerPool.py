@@ -0,0 +1,34 @@
+# workerPool.py
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))  # server processes on this box, each with its own pool (gunicorn.conf.py exports it)
+# processes per pool: the cores split between the server workers, so together they don't oversubscribe the CPU
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(max(1, (os.cpu_count() or 1) // max(1, WEB_WORKERS)))))
+POOL_PRELOAD = ["pdfParser"]  # modules whose functions run in the pool
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Shared process pool for CPU-bound PDF work (parsing).
+    Created lazily and re-created after a fork so every server worker owns its own pool.
+    Children come from a forkserver rather than fork(): server workers are multi-threaded and hold
+    torch, so a forked child could inherit a lock (logging's, say) held by another thread and deadlock.
+    The forkserver preloads only the Flask- and model-free task modules. Under `python app.py` children
+    also re-import app.py as __mp_main__ (cheap: models are loaded by init_worker, not at import); under
+    gunicorn __main__ is gunicorn itself.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(POOL_PRELOAD)
+            _pool = ProcessPoolExecutor(max_workers=max(1, PARSE_WORKERS), mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
@@ -0,0 +1,21 @@
+# wsgi.py
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+from app import app as flask_app, load_shared_state
+
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1").lower() in ("1", "true", "yes")
+
+
+def create_app(preload_models=PRELOAD_MODELS):
+    """
+    WSGI app factory.
+    With preload_models the classifier/embedder are loaded here; under gunicorn's preload_app that
+    is the master process, so every forked worker shares the read-only weights copy-on-write.
+    Per-worker start-up (warm-up, readiness) runs after the fork via app.init_worker.
+    """
+    if preload_models:
+        load_shared_state()
+    return flask_app
+
+
+app = create_app()
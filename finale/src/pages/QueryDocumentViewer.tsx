@@ -26,6 +26,8 @@ declare global {
 }
 interface ExtractedSection { document: string; importance_rank: number; page_number: number; section_title: string; rects?: any[]; }
 interface SubsectionAnalysis { document: string; page_number: number; refined_text: string; }
+// one highlight rect; pdf_bbox is in PDF user space (bottom-left origin), as the annotation API expects
+interface HighlightBox { page: number; bbox: number[]; pdf_bbox: number[]; color: string; }
 declare global {
   interface QueryResult {
     extracted_sections: ExtractedSection[];
@@ -35,7 +37,7 @@ declare global {
       job_to_be_done?: string;
       persona?: string;
       processing_timestamp?: string;
-      annotated_files?: { [original: string]: string };
+      highlights?: { [original: string]: HighlightBox[] };
       llm_input: string;
     };
     insights?: any;
@@ -165,21 +167,55 @@ const QueryDocumentViewer: React.FC = () => {
     if (container) container.innerHTML = '';
 
     const adobeDCView = new (window as any).AdobeDC.View({ clientId: "ce717f3e6e444a8893c4c7e873884e35", divId: 'pdf-viewer' });
-    const annotatedFiles = result?.metadata?.annotated_files || {};
-    const annotatedForThis = annotatedFiles[currentPDF.serverFilename];
-    const ts = result?.metadata?.processing_timestamp ? encodeURIComponent(result.metadata.processing_timestamp) : Date.now();
-    const filenameToLoad = annotatedForThis || currentPDF.serverFilename;
-    const url = `http://localhost:5001/uploads/${filenameToLoad}?t=${ts}`;
+    // the original PDF; this query's highlights are drawn over it instead of loading an annotated copy
+    const fileId = currentPDF.serverFilename;
+    const url = `http://localhost:5001/uploads/${fileId}`;
+    const boxes = result?.metadata?.highlights?.[fileId] || [];
+    const now = new Date().toISOString();
+    const annotations = boxes.map((box, i) => {
+      const [x0, y0, x1, y1] = box.pdf_bbox;
+      return {
+        '@context': ['https://www.w3.org/ns/anno.jsonld', 'https://comments.acrobat.com/ns/anno.jsonld'],
+        type: 'Annotation',
+        id: `highlight-${i}`,
+        bodyValue: '',
+        motivation: 'commenting',
+        target: {
+          source: fileId,
+          selector: {
+            node: { index: box.page - 1 },
+            opacity: 0.4,
+            subtype: 'highlight',
+            boundingBox: [x0, y0, x1, y1],
+            quadPoints: [x0, y1, x1, y1, x0, y0, x1, y0],
+            strokeColor: box.color,
+            type: 'AdobeAnnoSelector'
+          }
+        },
+        creator: { type: 'Person', name: 'Query' },
+        created: now,
+        modified: now
+      };
+    });
 
-    adobeDCView.previewFile({ content: { location: { url } }, metaData: { fileName: currentPDF.name } },
-      { embedMode: 'FULL_WINDOW', defaultViewMode: 'FIT_PAGE', showAnnotationTools: true, enableSearchAPIs: true })
-      .then((viewer: any) => {
+    adobeDCView.previewFile({ content: { location: { url } }, metaData: { fileName: currentPDF.name, id: fileId } },
+      { embedMode: 'FULL_WINDOW', defaultViewMode: 'FIT_PAGE', showAnnotationTools: true, enableSearchAPIs: true,
+        enableAnnotationAPIs: true, includePDFAnnotations: true })
+      .then(async (viewer: any) => {
         viewerRef.current = viewer;
+        if (annotations.length) {
+          try {
+            const annotationManager = await viewer.getAnnotationManager();
+            await annotationManager.addAnnotations(annotations);
+          } catch (err) {
+            console.error('Adobe addAnnotations error:', err);
+          }
+        }
         if (requestedPage) setTimeout(() => attemptGoto(requestedPage), 500);
       }).catch((err: any) => console.error('Adobe previewFile error:', err));
 
     return () => { viewerRef.current = null; };
-  }, [currentPDF, result?.metadata?.annotated_files, result?.metadata?.processing_timestamp]);
+  }, [currentPDF, result?.metadata?.highlights]);
 
   const handleSectionClick = (section: ExtractedSection) => {
     const matchingAnalysis = result?.subsection_analysis?.find(a => a.document === section.document && a.page_number === section.page_number);